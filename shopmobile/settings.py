@@ -2,6 +2,7 @@
 Django settings for shopmobile project.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project
@@ -27,6 +28,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Per-view latency histograms, served at /qhun22/metrics/
+    'store.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,11 +39,28 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view SQL query budgets (see store.query_budget), off by default:
+# 'warn' logs requests over budget, 'strict' raises (for test runs).
+STORE_QUERY_BUDGET = os.environ.get('STORE_QUERY_BUDGET', '')
+if STORE_QUERY_BUDGET:
+    # Outermost, so session and auth queries are counted too
+    MIDDLEWARE.insert(0, 'store.query_budget.QueryBudgetMiddleware')
+
+# Sample this fraction of requests under cProfile and dump those slower
+# than STORE_PROFILE_SLOW_MS to STORE_PROFILE_DIR (see store.metrics)
+STORE_PROFILE_SAMPLE_RATE = float(os.environ.get('STORE_PROFILE_SAMPLE_RATE', '0'))
+STORE_PROFILE_SLOW_MS = int(os.environ.get('STORE_PROFILE_SLOW_MS', '500'))
+STORE_PROFILE_DIR = os.environ.get('STORE_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+# Shared secret letting marketplace feeds pull /api/export/products/?token=...
+STORE_EXPORT_TOKEN = os.environ.get('STORE_EXPORT_TOKEN', '')
+
 ROOT_URLCONF = 'shopmobile.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, timing renders for store.metrics
+        'BACKEND': 'store.metrics.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -49,6 +69,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.cart',
             ],
         },
     },
@@ -61,9 +82,40 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than the in-memory default, so the threads of the
+        # concurrency tests wait for SQLite's write lock as in production
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Cache
+# 'locmem' suits a single worker process. When running several gunicorn
+# workers on one box, use a shared tier so invalidations reach every
+# worker: 'file' (no setup) or 'db' (run `python manage.py createcachetable`).
+STORE_CACHE_BACKEND = os.environ.get('STORE_CACHE_BACKEND', 'locmem')
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shopmobile',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'store_cache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[STORE_CACHE_BACKEND],
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
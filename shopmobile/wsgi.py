@@ -10,5 +10,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shopmobile.settings')
 
 application = get_wsgi_application()
 
+# Build the search suggestion index in the background as soon as the
+# server starts, instead of in a visitor's request
+from store.suggest import suggest_index  # noqa: E402
+
+suggest_index.start()
+
 
 
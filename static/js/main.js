@@ -210,6 +210,80 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     })();
 
+    // ===== SEARCH SUGGESTIONS =====
+    (function() {
+        const input = document.getElementById('headerSearchInput');
+        const box = document.getElementById('headerSearchSuggestions');
+
+        if (!input || !box) return;
+
+        const icons = {
+            product: 'fa-mobile-alt',
+            brand: 'fa-tag',
+            category: 'fa-th-large'
+        };
+        let timer = null;
+        let lastQuery = '';
+
+        function hideSuggestions() {
+            box.classList.add('hidden');
+            box.innerHTML = '';
+        }
+
+        function renderSuggestions(suggestions) {
+            if (suggestions.length === 0) {
+                hideSuggestions();
+                return;
+            }
+            box.innerHTML = '';
+            suggestions.forEach(function(item) {
+                const link = document.createElement('a');
+                link.href = item.url;
+                link.className = 'flex items-center gap-3 px-4 py-2 text-sm text-gray-700 hover:bg-gray-100';
+                const icon = document.createElement('i');
+                icon.className = 'fas ' + (icons[item.type] || 'fa-search') + ' text-gray-400 w-4';
+                const label = document.createElement('span');
+                label.textContent = item.label;
+                link.appendChild(icon);
+                link.appendChild(label);
+                box.appendChild(link);
+            });
+            box.classList.remove('hidden');
+        }
+
+        input.addEventListener('input', function() {
+            const query = input.value.trim();
+            clearTimeout(timer);
+            if (!query) {
+                lastQuery = '';
+                hideSuggestions();
+                return;
+            }
+            timer = setTimeout(function() {
+                lastQuery = query;
+                fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(query))
+                    .then(response => response.json())
+                    .then(data => {
+                        // Ignore responses for queries the user already typed past
+                        if (data.success && data.query === lastQuery) {
+                            renderSuggestions(data.suggestions);
+                        }
+                    })
+                    .catch(() => hideSuggestions());
+            }, 120);
+        });
+
+        input.addEventListener('keydown', function(e) {
+            if (e.key === 'Escape') hideSuggestions();
+        });
+
+        document.addEventListener('click', function(e) {
+            if (!input.contains(e.target) && !box.contains(e.target)) {
+                hideSuggestions();
+            }
+        });
+    })();
+
     // ===== HEADER SCROLL EFFECT =====
     (function() {
         const header = document.querySelector('header');
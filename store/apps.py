@@ -6,5 +6,6 @@ class StoreConfig(AppConfig):
     name = 'store'
     verbose_name = 'Store Management'
 
-
-
+    def ready(self):
+        # Connect model signal handlers
+        import store.signals  # noqa: F401
@@ -0,0 +1,212 @@
+"""
+Caching layer for the store app.
+
+All store cache entries go through this module so that they share:
+
+* namespaced keys: ``store:<namespace>:v<version>:<parts>``;
+* namespace versions: ``bump(namespace)`` invalidates every key in the
+  namespace at once without knowing the keys;
+* TTL policies per object type (``TTL``);
+* stampede protection in ``get_or_set``: entries are refreshed slightly
+  before they expire (probabilistic early expiry) and only one caller
+  recomputes a missing or stale value at a time (single-flight lock),
+  while the others keep serving the previous value.
+
+The backend itself is configured by ``CACHES`` in settings: local memory
+for a single worker, or the file / database cache when several workers
+must share invalidations.
+"""
+
+import hashlib
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import caches
+
+
+# Seconds each kind of object may stay cached
+TTL = {
+    'product': 600,
+    'category': 3600,
+    'promotion': 300,
+    'coupon': 120,
+    'page': 600,
+    'fragment': 3600,
+}
+DEFAULT_TTL = 300
+
+KEY_PREFIX = 'store'
+
+# How long a recompute lock is held before another caller may try
+LOCK_TIMEOUT = 10
+
+# How long callers without any value wait for another caller's recompute
+LOCK_WAIT = 2.0
+
+# XFetch beta: > 1 favours earlier refreshes
+EARLY_EXPIRY_BETA = 1.0
+
+
+def get_cache():
+    return caches['default']
+
+
+def is_shared():
+    """
+    Return True if the backend is shared between processes (file,
+    database, memcached...), False for the per-process local memory and
+    dummy caches.
+
+    Background jobs only help the web processes through a shared backend.
+    """
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def ttl_for(namespace):
+    """Return the TTL policy of a namespace ('product:detail' -> 'product')."""
+    return TTL.get(namespace.split(':', 1)[0], DEFAULT_TTL)
+
+
+# ==================== NAMESPACE VERSIONS ====================
+
+def version_key(namespace):
+    return f'{KEY_PREFIX}:version:{namespace}'
+
+
+def get_versions(namespaces):
+    """Return {namespace: version} for the given namespaces, creating missing ones."""
+    cache = get_cache()
+    keys = {version_key(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # add() keeps a version another process created in the meantime
+        for key in missing:
+            cache.add(key, 1, None)
+        found.update(cache.get_many(missing))
+    return {namespace: found.get(key, 1) for key, namespace in keys.items()}
+
+
+def get_version(namespace):
+    return get_versions([namespace])[namespace]
+
+
+def bump(*namespaces):
+    """Invalidate every key in the given namespaces; return their new versions."""
+    cache = get_cache()
+    versions = {}
+    for namespace in namespaces:
+        key = version_key(namespace)
+        try:
+            versions[namespace] = cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+            versions[namespace] = 2
+    return versions
+
+
+def get_epoch():
+    """
+    Return a random token identifying the current cache contents.
+
+    Changes whenever the cache is cleared or restarted, when every
+    namespace version falls back to 1; values derived from versions
+    (such as ETags) include it so they never repeat.
+    """
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:epoch'
+    cache.add(key, uuid.uuid4().hex, None)
+    return cache.get(key)
+
+
+def reset_epoch():
+    """Start a new epoch, e.g. after a bulk change that bypassed the signals."""
+    get_cache().set(f'{KEY_PREFIX}:epoch', uuid.uuid4().hex, None)
+
+
+# ==================== KEYS ====================
+
+def make_key(namespace, *parts, version=None):
+    """Build a versioned key; long or unusual parts are hashed."""
+    if version is None:
+        version = get_version(namespace)
+    raw = ':'.join(str(part) for part in parts)
+    if len(raw) > 120 or not raw.replace(':', '').replace('-', '').replace('_', '').isalnum():
+        raw = hashlib.md5(raw.encode()).hexdigest()
+    return f'{KEY_PREFIX}:{namespace}:v{version}:{raw}'
+
+
+# ==================== GET / SET ====================
+
+def get(namespace, *parts, default=None):
+    entry = get_cache().get(make_key(namespace, *parts))
+    return default if entry is None else entry['value']
+
+
+def set(namespace, *parts, value, ttl=None):
+    ttl = ttl_for(namespace) if ttl is None else ttl
+    get_cache().set(make_key(namespace, *parts), _entry(value, 0, ttl), ttl)
+
+
+def delete(namespace, *parts):
+    get_cache().delete(make_key(namespace, *parts))
+
+
+def _entry(value, compute_time, ttl):
+    return {'value': value, 'delta': compute_time, 'expires': time.time() + ttl}
+
+
+def _should_refresh(entry):
+    """XFetch: refresh early with a probability that grows near expiry."""
+    if entry['delta'] <= 0:
+        return time.time() >= entry['expires']
+    jitter = entry['delta'] * EARLY_EXPIRY_BETA * -math.log(random.random() or 1e-12)
+    return time.time() + jitter >= entry['expires']
+
+
+def get_or_set(namespace, *parts, producer, ttl=None):
+    """
+    Return the cached value for the key, computing it with `producer()` if needed.
+
+    Protects against stampedes: a value close to expiry is refreshed early
+    by a single caller, and callers that lose the recompute lock keep
+    using the previous value (or briefly wait for the winner when there
+    is none).
+    """
+    cache = get_cache()
+    ttl = ttl_for(namespace) if ttl is None else ttl
+    key = make_key(namespace, *parts)
+    lock_key = key + ':lock'
+
+    entry = cache.get(key)
+    if entry is not None and not _should_refresh(entry):
+        return entry['value']
+
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if not locked:
+        # Someone else is recomputing
+        if entry is not None:
+            return entry['value']
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value']
+        # Give up waiting and compute without the lock
+
+    try:
+        started = time.monotonic()
+        value = producer()
+        # Keep the entry a little past its logical expiry so stale values
+        # can be served while it is being refreshed
+        cache.set(key, _entry(value, time.monotonic() - started, ttl), ttl + LOCK_TIMEOUT)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
@@ -0,0 +1,265 @@
+"""
+Shopping cart.
+
+Anonymous visitors keep their cart in the session as a compact list of
+`[product_id, storage, color, warranty, quantity]` lines; logged-in users
+keep it in `CartItem` rows, and the session cart is merged into them on
+login. Either way the session also holds the total item count, so the
+header badge is rendered without touching the database.
+
+A cart line only stores ids and chosen options. Prices, stock,
+`SpecialPromotion` discounts and option validity are resolved for all
+lines at once by `resolve_lines`, with a single query.
+"""
+
+import hashlib
+import json
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Subquery, Sum
+
+from store.models import CartItem, Product, SpecialPromotion
+
+
+SESSION_KEY = 'cart'
+COUNT_SESSION_KEY = 'cart_count'
+
+MAX_LINES = 30
+MAX_QUANTITY = 10
+
+# A line's options, each checked against Product.<option>_options
+OPTIONS = ('storage', 'color', 'warranty')
+
+
+class CartError(Exception):
+    """Raised with a user-facing message when a cart change is refused."""
+
+
+CartLine = namedtuple('CartLine', 'product_id storage color warranty quantity')
+
+
+def line_key(line):
+    """Return a short stable id for a line's product and options."""
+    raw = json.dumps([line.product_id, line.storage, line.color, line.warranty])
+    return hashlib.md5(raw.encode()).hexdigest()[:12]
+
+
+def cart_count(request):
+    """Return the number of items in the cart, from the session only."""
+    return request.session.get(COUNT_SESSION_KEY, 0)
+
+
+def clean_options(product, options):
+    """Validate the chosen options; default to the first one when omitted."""
+    cleaned = {}
+    for option in OPTIONS:
+        choices = getattr(product, f'{option}_options') or []
+        value = (options.get(option) or '').strip()
+        if not value and choices:
+            value = choices[0]
+        if value and value not in choices:
+            raise CartError('Tùy chọn sản phẩm không hợp lệ.')
+        cleaned[option] = value
+    return cleaned
+
+
+# ==================== CART ====================
+
+class Cart:
+    """The current visitor's cart: session lines, or CartItem rows once logged in."""
+
+    def __init__(self, request):
+        self.request = request
+        self.session = request.session
+        self.user = request.user if request.user.is_authenticated else None
+
+    def lines(self):
+        if self.user:
+            return [CartLine(*values) for values in CartItem.objects.filter(user=self.user).values_list(
+                'product_id', 'storage', 'color', 'warranty', 'quantity'
+            )]
+        return [CartLine(*values) for values in self.session.get(SESSION_KEY, [])]
+
+    def add(self, product, quantity=1, **options):
+        """Add `quantity` of a product with the given options; return the line."""
+        if not product.is_active:
+            raise CartError('Sản phẩm không còn kinh doanh.')
+        options = clean_options(product, options)
+        new_line = CartLine(product.id, options['storage'], options['color'], options['warranty'], 0)
+        key = line_key(new_line)
+
+        lines = self.lines()
+        current = next((line for line in lines if line_key(line) == key), None)
+        if current is None and len(lines) >= MAX_LINES:
+            raise CartError(f'Giỏ hàng tối đa {MAX_LINES} sản phẩm.')
+        total = min((current.quantity if current else 0) + max(quantity, 1), MAX_QUANTITY)
+        if total > product.stock:
+            raise CartError(f'Chỉ còn {product.stock} sản phẩm trong kho.')
+
+        line = new_line._replace(quantity=total)
+        if self.user:
+            # The lines were just read, so insert or update without another lookup
+            items = CartItem.objects.filter(user=self.user, product_id=product.id, **options)
+            if current is None:
+                try:
+                    with transaction.atomic():
+                        CartItem.objects.create(user=self.user, product_id=product.id, quantity=total, **options)
+                except IntegrityError:
+                    # Added from another tab in the meantime
+                    items.update(quantity=total)
+            else:
+                items.update(quantity=total)
+        if current is None:
+            lines.append(line)
+        else:
+            lines = [line if line_key(item) == key else item for item in lines]
+        self.save(lines)
+        return line
+
+    def set_quantity(self, key, quantity):
+        """Change a line's quantity; 0 removes it."""
+        quantity = min(max(quantity, 0), MAX_QUANTITY)
+        lines = []
+        for line in self.lines():
+            if line_key(line) == key:
+                if self.user:
+                    items = CartItem.objects.filter(
+                        user=self.user, product_id=line.product_id,
+                        storage=line.storage, color=line.color, warranty=line.warranty,
+                    )
+                    if quantity:
+                        items.update(quantity=quantity)
+                    else:
+                        items.delete()
+                if not quantity:
+                    continue
+                line = line._replace(quantity=quantity)
+            lines.append(line)
+        self.save(lines)
+
+    def remove(self, key):
+        self.set_quantity(key, 0)
+
+    def clear(self):
+        if self.user:
+            CartItem.objects.filter(user=self.user).delete()
+        self.save([])
+
+    def save(self, lines):
+        """Store the lines (session carts) and the item count for the badge."""
+        if not self.user:
+            if lines:
+                self.session[SESSION_KEY] = [list(line) for line in lines]
+            else:
+                self.session.pop(SESSION_KEY, None)
+        self.session[COUNT_SESSION_KEY] = sum(line.quantity for line in lines)
+
+    def resolve(self):
+        lines = self.lines()
+        # Keep the badge right after changes made from another device
+        count = sum(line.quantity for line in lines)
+        if cart_count(self.request) != count:
+            self.session[COUNT_SESSION_KEY] = count
+        return resolve_lines(lines)
+
+
+def merge_session_cart(request, user):
+    """Move an anonymous session cart into the user's CartItem rows."""
+    session_lines = [CartLine(*values) for values in request.session.pop(SESSION_KEY, [])]
+    if session_lines:
+        existing = {
+            (item.product_id, item.storage, item.color, item.warranty): item
+            for item in CartItem.objects.filter(user=user)
+        }
+        product_ids = set(Product.objects.filter(
+            id__in={line.product_id for line in session_lines}
+        ).values_list('id', flat=True))
+
+        new_items, changed_items = [], []
+        for line in session_lines:
+            if line.product_id not in product_ids:
+                continue
+            item = existing.get(line[:4])
+            if item is None:
+                item = CartItem(
+                    user=user, product_id=line.product_id, storage=line.storage,
+                    color=line.color, warranty=line.warranty, quantity=line.quantity,
+                )
+                existing[line[:4]] = item
+                new_items.append(item)
+            else:
+                item.quantity = min(item.quantity + line.quantity, MAX_QUANTITY)
+                if item.pk:
+                    changed_items.append(item)
+        CartItem.objects.bulk_create(new_items)
+        CartItem.objects.bulk_update(changed_items, ['quantity'])
+
+    total = CartItem.objects.filter(user=user).aggregate(total=Sum('quantity'))['total']
+    request.session[COUNT_SESSION_KEY] = total or 0
+
+
+# ==================== PRICE RESOLUTION ====================
+
+def resolve_lines(lines, check_stock=True):
+    """
+    Price a list of CartLines with one query for all their products.
+
+    Each resolved line carries the unit price after any active special
+    promotion and a `problem` message when it cannot be ordered as is
+    (product gone or inactive, option withdrawn, not enough stock).
+    `check_stock=False` skips the stock check, for callers that already
+    took the stock.
+    """
+    promotions = SpecialPromotion.objects.filter(
+        product_id=OuterRef('pk'), is_active=True
+    ).order_by('-created_at')
+    products = Product.objects.annotate(
+        promotion_percent=Subquery(promotions.values('discount_percent')[:1]),
+    ).only(
+        'id', 'name', 'slug', 'image', 'price', 'original_price', 'stock', 'is_active',
+        'storage_options', 'color_options', 'warranty_options',
+    ).in_bulk({line.product_id for line in lines})
+
+    resolved = []
+    total = 0
+    for line in lines:
+        product = products.get(line.product_id)
+        problem = ''
+        unit_price = 0
+        if product is None or not product.is_active:
+            problem = 'Sản phẩm không còn kinh doanh.'
+        else:
+            unit_price = int(product.price)
+            if product.promotion_percent:
+                unit_price = int(product.price * (100 - product.promotion_percent) / 100)
+            if any(
+                getattr(line, option) and getattr(line, option) not in (getattr(product, f'{option}_options') or [])
+                for option in OPTIONS
+            ):
+                problem = 'Tùy chọn sản phẩm không còn được bán.'
+            elif check_stock and product.stock < line.quantity:
+                problem = f'Chỉ còn {product.stock} sản phẩm trong kho.'
+
+        subtotal = unit_price * line.quantity
+        if not problem:
+            total += subtotal
+        resolved.append({
+            'key': line_key(line),
+            'product': product,
+            'storage': line.storage,
+            'color': line.color,
+            'warranty': line.warranty,
+            'quantity': line.quantity,
+            'unit_price': unit_price,
+            'original_price': int(product.price) if product and unit_price < product.price else None,
+            'subtotal': subtotal,
+            'problem': problem,
+        })
+
+    return {
+        'lines': resolved,
+        'count': sum(line.quantity for line in lines),
+        'total': total,
+        'has_problems': any(line['problem'] for line in resolved),
+    }
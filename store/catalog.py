@@ -0,0 +1,388 @@
+"""
+Catalog query service shared by the storefront listing views.
+"""
+
+import base64
+import json
+import math
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.core.paginator import Paginator
+from django.db.models import Case, Count, Q, Value, When
+from django.utils.dateparse import parse_datetime
+from store.models import Product
+from store.filter_index import filter_index
+from store.images import build_srcset
+from store.search import get_search_backend
+
+
+# Price filter buckets: (GET value, label, min price inclusive, max price exclusive)
+PRICE_BUCKETS = (
+    ('0-2000000', 'Dưới 2 triệu', None, 2000000),
+    ('2000000-4000000', '2 - 4 triệu', 2000000, 4000000),
+    ('4000000-7000000', '4 - 7 triệu', 4000000, 7000000),
+    ('7000000-13000000', '7 - 13 triệu', 7000000, 13000000),
+    ('13000000-20000000', '13 - 20 triệu', 13000000, 20000000),
+    ('20000000-999999999', 'Trên 20 triệu', 20000000, None),
+)
+
+# GET value -> (min price, max price)
+PRICE_RANGES = {value: (price_min, price_max) for value, _, price_min, price_max in PRICE_BUCKETS}
+
+# Sort options: GET value -> order_by fields (`id` breaks ties so page
+# boundaries are stable and match the in-memory filter index)
+SORT_ORDERS = {
+    'asc': ('price', 'id'),
+    'desc': ('-price', '-id'),
+    'default': ('-created_at', '-is_featured', '-id'),
+}
+
+# Keyset (cursor) pagination walks the same orderings as page numbers, so
+# both modes list products in the same order. Every ordering ends with `id`,
+# which makes the key unique and keeps pages from overlapping.
+def keyset_fields(ordering):
+    """Return the cursor key fields (without `id`) for an ordering."""
+    return [field.lstrip('-') for field in ordering[:-1]]
+
+# Columns needed to render a product card (home grid and /api/products/)
+CARD_FIELDS = (
+    'id',
+    'name',
+    'slug',
+    'brand',
+    'price',
+    'original_price',
+    'discount_percent',
+    'image',
+    'image_variants',
+    'image_lqip',
+    'stock',
+    'updated_at',
+    'created_at',
+    'is_featured',
+    'category__name',
+)
+
+
+class CatalogQuery:
+    """
+    Parse the listing GET parameters once and build a single queryset.
+
+    Used by both `home` and `api_products` so filtering, sorting and
+    pagination stay identical between the page and the AJAX endpoint.
+    """
+    per_page = 10
+    filter_index_enabled = True
+
+    def __init__(self, params):
+        self.search_query = params.get('q', '').strip()
+        self.brand_filter = params.get('brand', '').strip()
+        self.price_filter = params.get('price', '')
+        if self.price_filter not in PRICE_RANGES:
+            self.price_filter = ''
+        self.category_filter = params.get('category', '')
+        if not self.category_filter.isdigit():
+            self.category_filter = ''
+        self.in_stock = params.get('in_stock', '') == '1'
+        self.sort = params.get('sort', 'default')
+        if self.sort not in SORT_ORDERS:
+            self.sort = 'default'
+        self.page_number = params.get('page', 1)
+
+    def filter_queryset(self, products, facets=False):
+        """
+        Apply search, brand, price, category and stock filters.
+
+        With `facets=True` only the search filter is applied; the other
+        filters are applied in Python by `get_facets`.
+        """
+        if self.search_query:
+            products = get_search_backend().filter_queryset(products, self.search_query)
+
+        if facets:
+            return products
+
+        if self.brand_filter:
+            products = products.filter(brand__iexact=self.brand_filter)
+
+        if self.price_filter:
+            price_min, price_max = PRICE_RANGES[self.price_filter]
+            if price_min is not None:
+                products = products.filter(price__gte=price_min)
+            if price_max is not None:
+                products = products.filter(price__lt=price_max)
+
+        if self.category_filter:
+            products = products.filter(category_id=self.category_filter)
+
+        if self.in_stock:
+            products = products.filter(is_out_of_stock=False)
+
+        return products
+
+    def ranks_search(self):
+        """
+        Return True if results are ordered by search relevance.
+
+        Searches with the default sort list the best matches first; an
+        explicit price sort still wins.
+        """
+        return bool(self.search_query) and self.sort == 'default'
+
+    def get_ordering(self):
+        """Return the order_by fields for the listing."""
+        if self.ranks_search():
+            return ('search_rank',) + SORT_ORDERS[self.sort]
+        return SORT_ORDERS[self.sort]
+
+    def get_queryset(self):
+        """Return the filtered, sorted queryset of product card columns."""
+        products = Product.objects.filter(is_active=True).select_related('category')
+        products = self.filter_queryset(products)
+        if self.ranks_search():
+            products = get_search_backend().rank_queryset(products, self.search_query)
+        return products.only(*CARD_FIELDS).order_by(*self.get_ordering())
+
+    def use_filter_index(self):
+        """
+        Return True if the in-memory filter index can answer this query.
+
+        Full-text search still goes to the database.
+        """
+        return self.filter_index_enabled and not self.search_query
+
+    def get_page(self):
+        """
+        Return the requested page of products.
+
+        The paginator runs the only COUNT query; callers should read the
+        total from `page.paginator.count` instead of counting again.
+        """
+        if self.use_filter_index():
+            products = filter_index.match(self)
+        else:
+            products = self.get_queryset()
+        paginator = Paginator(products, self.per_page)
+        return paginator.get_page(self.page_number)
+
+    def get_next_cursor(self, product_page):
+        """
+        Return the cursor for the page after a numbered page, or None.
+
+        Lets a client that opened a numbered page continue in cursor mode.
+        """
+        if not product_page.has_next():
+            return None
+        return encode_cursor(self.sort, self.get_ordering(), product_page.object_list[-1])
+
+    def get_keyset_page(self, cursor=''):
+        """
+        Return `(products, next_cursor)` for cursor-based pagination.
+
+        The page is located with a `WHERE (keys..., id) > (last keys..., last_id)`
+        style filter instead of OFFSET, so deep pages cost the same as the
+        first one. No COUNT query is run. Raises `InvalidCursor` for a
+        malformed or foreign cursor.
+        """
+        ordering = self.get_ordering()
+        products = self.get_queryset()
+
+        if cursor:
+            last_keys, last_id = decode_cursor(cursor, self.sort, ordering)
+            # Lexicographic "after": the first field that differs decides
+            values = [*last_keys, last_id]
+            after = Q()
+            for position, field in enumerate(ordering):
+                name = field.lstrip('-')
+                lookup = 'lt' if field.startswith('-') else 'gt'
+                equal = {prior.lstrip('-'): values[index] for index, prior in enumerate(ordering[:position])}
+                after |= Q(**equal, **{f'{name}__{lookup}': values[position]})
+            products = products.filter(after)
+
+        # Fetch one extra row to know whether another page exists
+        rows = list(products[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = encode_cursor(self.sort, ordering, rows[-1])
+        return rows, next_cursor
+
+    def get_facets(self):
+        """
+        Return facet counts for brand, price bucket, category and stock.
+
+        Counts come from one GROUP BY query over the products matching the
+        search query. Each facet ignores its own filter but respects the
+        others, so every option shows how many products it would return.
+        Without a search query the counts come from the filter index.
+        """
+        if self.use_filter_index():
+            return filter_index.facet_counts(self)
+
+        price_bucket = Case(
+            *[
+                When(
+                    Q(**({'price__gte': price_min} if price_min is not None else {})) &
+                    Q(**({'price__lt': price_max} if price_max is not None else {})),
+                    then=Value(value),
+                )
+                for value, _, price_min, price_max in PRICE_BUCKETS
+            ],
+            default=Value(''),
+        )
+        products = self.filter_queryset(Product.objects.filter(is_active=True), facets=True)
+        rows = (
+            products
+            .annotate(price_bucket=price_bucket)
+            .values('brand', 'price_bucket', 'category_id', 'category__name', 'is_out_of_stock')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+
+        brand_counts = {}
+        brand_labels = {}
+        price_counts = {}
+        category_counts = {}
+        category_labels = {}
+        stock_counts = {'in_stock': 0, 'out_of_stock': 0}
+
+        for row in rows:
+            brand = (row['brand'] or '').strip()
+            matches = {
+                'brand': not self.brand_filter or brand.lower() == self.brand_filter.lower(),
+                'price': not self.price_filter or row['price_bucket'] == self.price_filter,
+                'category': not self.category_filter or str(row['category_id']) == self.category_filter,
+                'stock': not self.in_stock or not row['is_out_of_stock'],
+            }
+
+            def counts_for(facet):
+                return all(matched for name, matched in matches.items() if name != facet)
+
+            count = row['count']
+            if brand and counts_for('brand'):
+                brand_key = brand.lower()
+                brand_labels.setdefault(brand_key, brand)
+                brand_counts[brand_key] = brand_counts.get(brand_key, 0) + count
+            if row['price_bucket'] and counts_for('price'):
+                price_counts[row['price_bucket']] = price_counts.get(row['price_bucket'], 0) + count
+            if row['category_id'] and counts_for('category'):
+                category_labels[row['category_id']] = row['category__name']
+                category_counts[row['category_id']] = category_counts.get(row['category_id'], 0) + count
+            if counts_for('stock'):
+                stock_key = 'out_of_stock' if row['is_out_of_stock'] else 'in_stock'
+                stock_counts[stock_key] += count
+
+        return {
+            'brand': [
+                {'value': brand_labels[key], 'label': brand_labels[key], 'count': brand_counts[key]}
+                for key in sorted(brand_counts)
+            ],
+            'price': [
+                {'value': value, 'label': label, 'count': price_counts.get(value, 0)}
+                for value, label, _, _ in PRICE_BUCKETS
+            ],
+            'category': [
+                {'value': category_id, 'label': category_labels[category_id], 'count': count}
+                for category_id, count in sorted(category_counts.items(), key=lambda item: category_labels[item[0]])
+            ],
+            'stock': stock_counts,
+        }
+
+    def get_filters(self):
+        """Return the normalized filter values."""
+        return {
+            'q': self.search_query,
+            'brand': self.brand_filter,
+            'price': self.price_filter,
+            'category': self.category_filter,
+            'in_stock': '1' if self.in_stock else '',
+            'sort': self.sort,
+        }
+
+    def build_query(self, page_num):
+        """Build a query string for the given page with the current filters."""
+        params = {key: value for key, value in self.get_filters().items() if value}
+        if params.get('sort') == 'default':
+            del params['sort']
+        params['page'] = page_num
+        return '?' + urlencode(params)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(sort, ordering, product):
+    """Encode the keyset position after `product` as an opaque token."""
+    keys = []
+    for field in keyset_fields(ordering):
+        key = getattr(product, field)
+        if field == 'created_at':
+            key = key.isoformat()
+        elif field == 'price':
+            key = str(key)
+        keys.append(key)
+    raw = json.dumps([sort, keys, product.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor_key(field, key):
+    """Parse one cursor key, or return None if it is not valid for `field`."""
+    if field == 'created_at':
+        return parse_datetime(key) if isinstance(key, str) else None
+    if field == 'is_featured':
+        return key if isinstance(key, bool) else None
+    if field == 'search_rank':
+        if isinstance(key, bool) or not isinstance(key, (int, float)):
+            return None
+        return key if math.isfinite(key) else None
+    if not isinstance(key, str):
+        return None
+    try:
+        key = Decimal(key)
+    except InvalidOperation:
+        return None
+    # NaN and Infinity parse but cannot be compared with a price column
+    return key if key.is_finite() else None
+
+
+def decode_cursor(cursor, sort, ordering):
+    """Decode a cursor token into `(keys, id)` for the given sort and ordering."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, keys, last_id = json.loads(raw)
+        if isinstance(last_id, bool) or not isinstance(last_id, int) or not isinstance(keys, list):
+            raise TypeError
+    except (ValueError, TypeError):
+        raise InvalidCursor('Cursor không hợp lệ.')
+
+    if cursor_sort != sort:
+        raise InvalidCursor('Cursor không khớp với kiểu sắp xếp.')
+
+    fields = keyset_fields(ordering)
+    if len(keys) != len(fields):
+        raise InvalidCursor('Cursor không hợp lệ.')
+    keys = [decode_cursor_key(field, key) for field, key in zip(fields, keys)]
+    if any(key is None for key in keys):
+        raise InvalidCursor('Cursor không hợp lệ.')
+    return keys, last_id
+
+
+def serialize_product_card(product):
+    """Serialize a product card for the JSON listing API."""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'slug': product.slug,
+        'brand': product.brand or '',
+        'price': float(product.price),
+        'original_price': float(product.original_price) if product.original_price else None,
+        'discount_percent': product.discount_percent,
+        'is_on_sale': bool(product.is_on_sale),
+        'image': str(product.image) if product.image else None,
+        'image_srcset': build_srcset(product.image_variants),
+        'stock': product.stock,
+        'category_name': product.category.name if product.category else '',
+    }
+
@@ -0,0 +1,249 @@
+"""
+Checkout: turn a logged-in user's cart into an Order.
+
+`place_order` runs in one transaction. Stock is taken with one
+conditional UPDATE per product (`stock = stock - qty WHERE stock >= qty`)
+instead of reading the product and calling save(): the database checks
+and decrements in a single statement, so concurrent buyers of the last
+units cannot both succeed, and the slug/discount logic of
+`Product.save()` is not re-run. If any product is short, the whole order
+rolls back. Order lines snapshot the product name, chosen options and
+the unit price at the time of purchase.
+
+Opening the checkout page holds the cart's quantities for
+`RESERVATION_MINUTES` (`StockReservation`). Other buyers see and can
+buy only the stock minus the active holds; the `release_reservations`
+command deletes expired holds in bulk.
+
+Since the UPDATE bypasses the Product signal handlers, the caches that
+show stock are refreshed explicitly once the order commits.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store import page_cache, payloads, sync
+from store.cart import resolve_lines
+from store.coupons import CouponError, redeem_coupon
+from store.filter_index import filter_index
+from store.models import Order, OrderItem, Product, StockReservation
+
+
+class CheckoutError(Exception):
+    """Raised with a user-facing message when an order cannot be placed."""
+
+
+class OutOfStock(CheckoutError):
+    pass
+
+
+class InvalidCoupon(CheckoutError):
+    pass
+
+
+RESERVATION_MINUTES = 10
+
+
+# ==================== RESERVATIONS ====================
+
+def active_reservations(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def reserved_quantities(product_ids, exclude_user=None, now=None):
+    """
+    Return `{product_id: quantity held}` for the active reservations, in
+    one grouped query on the (product, expires_at, quantity) index.
+    """
+    reservations = active_reservations(now).filter(product_id__in=product_ids)
+    if exclude_user is not None:
+        reservations = reservations.exclude(user=exclude_user)
+    return dict(
+        reservations.order_by().values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+
+
+def available_stock(product, exclude_user=None):
+    """Return the stock other buyers have not reserved."""
+    reserved = reserved_quantities([product.id], exclude_user).get(product.id, 0)
+    return max(product.stock - reserved, 0)
+
+
+def add_availability(cards):
+    """Set `available` on serialized product cards (one query for the page)."""
+    reserved = reserved_quantities([card['id'] for card in cards])
+    for card in cards:
+        card['available'] = max(card['stock'] - reserved.get(card['id'], 0), 0)
+    return cards
+
+
+def reserve_stock(user, quantities, names=None, minutes=RESERVATION_MINUTES):
+    """
+    Hold `{product_id: quantity}` for the user, replacing their previous
+    holds, or raise OutOfStock. Returns the expiry time.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(minutes=minutes)
+    # Only used to purge the pages of products no longer held
+    previous = set(StockReservation.objects.filter(user=user).values_list('product_id', flat=True))
+    with transaction.atomic():
+        # SQLite ignores select_for_update(): there this DELETE is what
+        # serializes concurrent holds. As the transaction's first statement
+        # it waits for the database write lock (a transaction that had
+        # read first would fail with "database is locked" instead) and
+        # keeps it until commit, before the stock and other holds are read.
+        # On backends with row locks the product locks do it instead.
+        StockReservation.objects.filter(user=user).delete()
+        products = Product.objects.select_for_update().filter(
+            id__in=quantities, is_active=True
+        ).only('id', 'stock').in_bulk()
+        reserved = reserved_quantities(list(quantities), now=now)
+        for product_id in sorted(quantities):
+            product = products.get(product_id)
+            if product is None or product.stock - reserved.get(product_id, 0) < quantities[product_id]:
+                name = (names or {}).get(product_id, f'#{product_id}')
+                raise OutOfStock(f'Sản phẩm "{name}" không đủ hàng.')
+        StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, user=user, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+        changed = previous | set(quantities)
+        transaction.on_commit(lambda: purge_stock_pages(changed))
+    return expires_at
+
+
+def release_expired(now=None):
+    """Delete expired holds in bulk; return how many were released."""
+    expired = StockReservation.objects.filter(expires_at__lte=now or timezone.now())
+    product_ids = set(expired.values_list('product_id', flat=True))
+    if not product_ids:
+        return 0
+    count, _ = expired.delete()
+    purge_stock_pages(product_ids)
+    return count
+
+
+# ==================== ORDERS ====================
+
+def decrement_stock(quantities, user=None):
+    """
+    Take `{product_id: quantity}` out of stock or raise OutOfStock.
+
+    The stock held by other users' active reservations is left alone;
+    `user`'s own holds are what they are buying. Must run inside a
+    transaction. Products are updated in id order so concurrent orders
+    lock rows in the same order.
+    """
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        held_by_others = active_reservations(now).filter(product_id=product_id)
+        if user is not None:
+            held_by_others = held_by_others.exclude(user=user)
+        held = Subquery(
+            held_by_others.order_by().values('product_id').annotate(total=Sum('quantity')).values('total')
+        )
+        updated = Product.objects.filter(
+            id=product_id, is_active=True, stock__gte=Coalesce(held, 0) + quantity
+        ).update(
+            stock=F('stock') - quantity,
+            is_out_of_stock=Case(When(stock=quantity, then=Value(True)), default=Value(False)),
+            updated_at=now,
+        )
+        if not updated:
+            name = Product.objects.filter(id=product_id).values_list('name', flat=True).first() or f'#{product_id}'
+            raise OutOfStock(f'Sản phẩm "{name}" không đủ hàng.')
+
+
+def refresh_stock_caches(product_ids):
+    """
+    Do what the Product save handlers would have done for a stock change.
+
+    The filter index only changes (and tells other workers to rebuild)
+    for products that just sold out.
+    """
+    products = list(Product.objects.filter(id__in=product_ids))
+    for product in products:
+        filter_index.update_product(product)
+        payloads.refresh_product_payload(product.id)
+    purge_stock_pages(product_ids, products)
+
+
+def purge_stock_pages(product_ids, products=None):
+    """Purge the pages and API listings showing these products' availability."""
+    if products is None:
+        products = Product.objects.filter(id__in=product_ids).only('slug', 'brand')
+    tags = {'listing:all'}
+    for product in products:
+        tags.add(page_cache.product_tag(product.slug))
+        tags.add(page_cache.brand_tag(product.brand))
+    page_cache.purge_tags(*tags)
+
+
+def place_order(cart, shipping_address=None, payment_method='cod', note='', coupon_code=''):
+    """
+    Create an Order from a `store.cart.Cart` of a logged-in user, taking
+    the stock, redeeming the coupon if any and emptying the cart. Raises
+    CheckoutError.
+    """
+    lines = cart.lines()
+    if not lines:
+        raise CheckoutError('Giỏ hàng đang trống.')
+
+    quantities = Counter()
+    for line in lines:
+        quantities[line.product_id] += line.quantity
+
+    with transaction.atomic():
+        # Write first: on SQLite a transaction that has already read cannot
+        # wait for the write lock held by another checkout and fails with
+        # "database is locked" at once. The conditional UPDATEs wait for
+        # the lock (up to the busy timeout) and check the stock themselves.
+        decrement_stock(quantities, user=cart.user)
+
+        resolved = resolve_lines(lines, check_stock=False)
+        if resolved['has_problems']:
+            raise CheckoutError('Giỏ hàng có sản phẩm không thể đặt, vui lòng kiểm tra lại.')
+
+        order = Order.objects.create(
+            user=cart.user,
+            payment_method=payment_method,
+            shipping_address=shipping_address,
+            note=note,
+            total_amount=resolved['total'],
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=line['product'],
+                product_name=' - '.join(filter(None, [
+                    line['product'].name, line['storage'], line['color'], line['warranty'],
+                ])),
+                product_price=line['unit_price'],
+                quantity=line['quantity'],
+            )
+            for line in resolved['lines']
+        ])
+
+        if coupon_code:
+            try:
+                redemption = redeem_coupon(coupon_code, cart.user, resolved['total'], order=order)
+            except CouponError as e:
+                raise InvalidCoupon(str(e))
+            order.discount_amount = redemption.discount_amount
+            order.total_amount = resolved['total'] - redemption.discount_amount
+            order.save(update_fields=['discount_amount', 'total_amount'])
+
+        cart.clear()
+        StockReservation.objects.filter(user=cart.user).delete()
+
+        product_ids = list(quantities)
+        sync.record_changes('product', product_ids)
+        transaction.on_commit(lambda: refresh_stock_caches(product_ids))
+
+    return order
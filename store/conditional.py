@@ -0,0 +1,73 @@
+"""
+ETag functions for conditional GET on the catalog pages and JSON APIs.
+
+ETags are derived from the page cache tag versions in `store.cache`
+(bumped by the signal handlers whenever a product, category or
+promotion changes) and the normalized request parameters, so a
+revalidation is answered with 304 before the view runs any query or
+renders a template. Use them with Django's `condition` decorator.
+"""
+
+import hashlib
+import json
+
+from django.contrib.messages import get_messages
+from django.utils.http import parse_etags
+
+from store import cache as store_cache
+from store.cart import cart_count
+from store.page_cache import brand_tag, listing_params, listing_tags, product_tag, tag_versions
+
+
+def make_etag(*parts):
+    """Hash the given parts together with the cache epoch into an ETag."""
+    raw = json.dumps([store_cache.get_epoch(), parts], sort_keys=True, default=str)
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def if_none_match(request, etag):
+    """
+    Return True if the request's If-None-Match matches `etag` (or is
+    `*`), using the weak comparison Django's `condition` applies.
+    """
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in etags:
+        return True
+    etag = etag.removeprefix('W/')
+    return any(candidate.removeprefix('W/') == etag for candidate in etags)
+
+
+def is_anonymous_page_request(request):
+    """
+    HTML pages are only validated for anonymous visitors with no pending
+    messages and an empty cart, since the header and toasts differ per user.
+    """
+    return not request.user.is_authenticated and not len(get_messages(request)) and not cart_count(request)
+
+
+def home_etag(request):
+    if not is_anonymous_page_request(request):
+        return None
+    catalog, params = listing_params(request)
+    tags = listing_tags(catalog)
+    return make_etag('home', params, tag_versions(tags))
+
+
+def product_detail_etag(request, slug):
+    if not is_anonymous_page_request(request):
+        return None
+    return make_etag('product_detail', slug, tag_versions([product_tag(slug)]))
+
+
+def api_products_etag(request):
+    catalog, params = listing_params(request)
+    params['cursor'] = request.GET.get('cursor')
+    params['include_total'] = request.GET.get('include_total', '')
+    # The JSON has no promotion carousel, but cards and facets carry category names
+    tags = ['categories']
+    if catalog.brand_filter:
+        tags.append(brand_tag(catalog.brand_filter))
+    # Facets count every brand; only later keyset pages are sent without them
+    if not params['cursor'] or not catalog.brand_filter:
+        tags.append('listing:all')
+    return make_etag('api_products', params, tag_versions(tags))
@@ -0,0 +1,10 @@
+"""
+Template context processors for the store app.
+"""
+
+from store.cart import cart_count
+
+
+def cart(request):
+    """Expose the cart item count for the header badge (session only, no query)."""
+    return {'cart_count': cart_count(request)}
@@ -0,0 +1,168 @@
+"""
+In-memory index of the active coupons, for validating codes as they are
+typed.
+
+The index maps normalized (upper-case) codes to immutable snapshots of
+every active coupon that has not ended yet, including ones that start
+later, and keeps `(end_date, code)` pairs sorted so that ended coupons
+are dropped from the front without touching the database. It is built
+on first use, kept current by the Coupon signal handlers in
+`store.signals`, and rebuilt when the next coupon starts or after
+`MAX_INDEX_AGE`, so other processes' changes (and uses) are picked up.
+
+Answers from the index are previews only: `store.coupons.redeem_coupon`
+re-checks everything in the database when the order is placed.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.utils import timezone
+
+from store.coupons import CouponError, compute_discount, normalize_code, unavailable_reason
+
+
+# Rebuild from the database after this many seconds
+MAX_INDEX_AGE = 300
+
+CouponSnapshot = namedtuple('CouponSnapshot', [
+    'id', 'code', 'name', 'description', 'discount_type', 'discount_value',
+    'min_order_amount', 'max_discount', 'start_date', 'end_date',
+    'is_active', 'usage_limit', 'used_count',
+])
+
+SNAPSHOT_FIELDS = CouponSnapshot._fields
+
+
+def snapshot(coupon):
+    return CouponSnapshot(*(getattr(coupon, field) for field in SNAPSHOT_FIELDS))
+
+
+class CouponIndex:
+    """Active coupons by code, with their end dates kept sorted."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.by_code = {}
+        self.expiries = []
+        self.refresh_at = None
+        self.built_at = None
+
+    # ---------- building ----------
+
+    def build(self):
+        """Load every active coupon that has not ended."""
+        from store.models import Coupon
+
+        now = timezone.now()
+        coupons = Coupon.objects.filter(is_active=True, end_date__gte=now).only(*SNAPSHOT_FIELDS)
+        with self.lock:
+            self.by_code = {}
+            self.expiries = []
+            for coupon in coupons:
+                self._add(snapshot(coupon))
+            self.expiries.sort()
+            self.built_at = time.monotonic()
+            self._schedule(now)
+
+    def ensure_current(self, now):
+        with self.lock:
+            if (
+                self.built_at is None
+                or time.monotonic() - self.built_at > MAX_INDEX_AGE
+                or (self.refresh_at is not None and now >= self.refresh_at)
+            ):
+                self.build()
+                return
+            # Drop the coupons that have ended, oldest first
+            ended = bisect_left(self.expiries, (now, ''))
+            for end_date, code in self.expiries[:ended]:
+                self.by_code.pop(code, None)
+            del self.expiries[:ended]
+
+    def _schedule(self, now):
+        """Rebuild when the next not-yet-started coupon starts."""
+        starts = [coupon.start_date for coupon in self.by_code.values() if coupon.start_date > now]
+        self.refresh_at = min(starts) if starts else None
+
+    def _add(self, coupon, sort=False):
+        code = normalize_code(coupon.code)
+        self.by_code[code] = coupon
+        if sort:
+            insort(self.expiries, (coupon.end_date, code))
+        else:
+            self.expiries.append((coupon.end_date, code))
+
+    def _remove(self, code):
+        coupon = self.by_code.pop(code, None)
+        if coupon is not None:
+            entry = (coupon.end_date, code)
+            index = bisect_left(self.expiries, entry)
+            if index < len(self.expiries) and self.expiries[index] == entry:
+                del self.expiries[index]
+
+    # ---------- incremental updates ----------
+
+    def update_coupon(self, coupon):
+        """Replace a coupon's entry after it was saved."""
+        with self.lock:
+            if self.built_at is None:
+                return
+            for code, indexed in list(self.by_code.items()):
+                if indexed.id == coupon.id:
+                    self._remove(code)
+            if coupon.is_active and coupon.end_date >= timezone.now():
+                self._add(snapshot(coupon), sort=True)
+            self._schedule(timezone.now())
+
+    def remove_coupon(self, coupon_id):
+        with self.lock:
+            if self.built_at is None:
+                return
+            for code, indexed in list(self.by_code.items()):
+                if indexed.id == coupon_id:
+                    self._remove(code)
+
+    def record_use(self, code, delta=1):
+        """Follow a redemption (or its cancellation) made by this process."""
+        code = normalize_code(code)
+        with self.lock:
+            coupon = self.by_code.get(code)
+            if coupon is not None:
+                self.by_code[code] = coupon._replace(used_count=max(coupon.used_count + delta, 0))
+
+    # ---------- lookup ----------
+
+    def active_coupons(self):
+        """Return the coupons usable now by date, soonest to end first."""
+        now = timezone.now()
+        with self.lock:
+            self.ensure_current(now)
+            return [
+                self.by_code[code] for end_date, code in self.expiries
+                if self.by_code[code].start_date <= now
+            ]
+
+    def validate(self, code, order_amount=None):
+        """
+        Check a code against the index; return `(coupon, discount)`.
+
+        `discount` is None when no order amount is given. Raises
+        CouponError with the reason a coupon cannot be used.
+        """
+        now = timezone.now()
+        with self.lock:
+            self.ensure_current(now)
+            coupon = self.by_code.get(normalize_code(code))
+        if coupon is None:
+            raise CouponError('Mã giảm giá không tồn tại hoặc đã hết hạn.')
+        reason = unavailable_reason(coupon, now)
+        if reason:
+            raise CouponError(reason)
+        discount = compute_discount(coupon, order_amount) if order_amount is not None else None
+        return coupon, discount
+
+
+coupon_index = CouponIndex()
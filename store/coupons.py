@@ -0,0 +1,126 @@
+"""
+Coupon redemption.
+
+`redeem_coupon` validates and consumes a use of a coupon with a single
+conditional UPDATE:
+
+    UPDATE coupon SET used_count = used_count + 1
+    WHERE id = ? AND is_active AND start_date <= now AND end_date >= now
+      AND used_count < usage_limit
+
+so concurrent checkouts can never take more uses than `usage_limit`,
+unlike checking `Coupon.is_valid()` and saving. The use is recorded as a
+`CouponRedemption` row in the same transaction (one active use per user
+and coupon), and `cancel_redemption` gives it back, e.g. when the order
+is cancelled.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from store.models import Coupon, CouponRedemption
+from store.templatetags.format_filters import format_number
+
+
+class CouponError(Exception):
+    """Raised with a user-facing message when a coupon cannot be used."""
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def compute_discount(coupon, order_amount):
+    """
+    Return the discount of a coupon on an order amount, as an int.
+
+    Percent coupons are capped by `max_discount`; no discount exceeds
+    the order itself. Raises CouponError below `min_order_amount`.
+    """
+    order_amount = int(order_amount)
+    if order_amount < coupon.min_order_amount:
+        raise CouponError(f'Đơn hàng tối thiểu {format_number(coupon.min_order_amount)}₫ để dùng mã này.')
+    if coupon.discount_type == 'percent':
+        discount = int(order_amount * coupon.discount_value / 100)
+        if coupon.max_discount:
+            discount = min(discount, int(coupon.max_discount))
+    else:
+        discount = int(coupon.discount_value)
+    return min(discount, order_amount)
+
+
+def unavailable_reason(coupon, now=None):
+    """Explain why a coupon cannot be used right now ('' if it can)."""
+    now = now or timezone.now()
+    if not coupon.is_active or coupon.end_date < now:
+        return 'Mã giảm giá đã hết hạn.'
+    if coupon.start_date > now:
+        return 'Mã giảm giá chưa đến thời gian sử dụng.'
+    if coupon.used_count >= coupon.usage_limit:
+        return 'Mã giảm giá đã hết lượt sử dụng.'
+    return ''
+
+
+def redeem_coupon(code, user, order_amount, order=None):
+    """
+    Consume one use of the coupon `code` for `user` and return the
+    CouponRedemption (its `discount_amount` is what to take off).
+    Raises CouponError and leaves the coupon untouched on failure.
+    """
+    coupon = Coupon.objects.filter(code=normalize_code(code)).first()
+    if coupon is None:
+        raise CouponError('Mã giảm giá không tồn tại.')
+    discount = compute_discount(coupon, order_amount)
+
+    now = timezone.now()
+    with transaction.atomic():
+        taken = Coupon.objects.filter(
+            id=coupon.id,
+            is_active=True,
+            start_date__lte=now,
+            end_date__gte=now,
+            used_count__lt=F('usage_limit'),
+        ).update(used_count=F('used_count') + 1, updated_at=now)
+        if not taken:
+            coupon.refresh_from_db()
+            raise CouponError(unavailable_reason(coupon, now) or 'Mã giảm giá không hợp lệ.')
+
+        try:
+            # Savepoint, so the outer transaction can still roll back cleanly
+            with transaction.atomic():
+                redemption = CouponRedemption.objects.create(
+                    coupon=coupon, user=user, order=order, discount_amount=discount
+                )
+        except IntegrityError:
+            raise CouponError('Bạn đã sử dụng mã giảm giá này.')
+        transaction.on_commit(lambda: record_index_use(coupon.code, 1))
+    return redemption
+
+
+def cancel_redemption(redemption):
+    """Give a use back to the coupon; returns False if already cancelled."""
+    with transaction.atomic():
+        cancelled = CouponRedemption.objects.filter(
+            id=redemption.id, cancelled_at__isnull=True
+        ).update(cancelled_at=timezone.now())
+        if cancelled:
+            Coupon.objects.filter(id=redemption.coupon_id, used_count__gt=0).update(
+                used_count=F('used_count') - 1, updated_at=timezone.now()
+            )
+            transaction.on_commit(lambda: record_index_use(redemption.coupon.code, -1))
+    return bool(cancelled)
+
+
+def record_index_use(code, delta):
+    # The UPDATEs above bypass the Coupon signal handlers
+    from store.coupon_index import coupon_index
+    coupon_index.record_use(code, delta)
+
+
+def cancel_order_coupon(order):
+    """Return the coupon use of a cancelled order, if it had one."""
+    redemption = CouponRedemption.objects.filter(
+        order=order, cancelled_at__isnull=True
+    ).select_related('coupon').first()
+    return cancel_redemption(redemption) if redemption else False
@@ -0,0 +1,152 @@
+"""
+Streaming catalog export for price-comparison sites and marketplaces.
+
+Products are read with `iterator(chunk_size=...)` and turned into CSV or
+JSON Lines one row at a time, optionally gzip-compressed on the fly, so
+the memory used does not grow with the catalog. Used by the
+`/api/export/products/` view and the `export_catalog` command.
+
+A full export lists the active products. An incremental export
+(`since`) lists every product changed after that time, and keeps
+inactive ones so consumers can delist them. Saving, deactivating or
+deleting a promotion and deleting a category touch the product's
+`updated_at` (see `store.signals`); a renamed category is matched on its
+own `updated_at`.
+"""
+
+import csv
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Q, Subquery
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from store.models import Product, SpecialPromotion
+
+
+EXPORT_COLUMNS = (
+    'id', 'slug', 'name', 'brand', 'category', 'price', 'original_price',
+    'promotion_price', 'stock', 'in_stock', 'is_active', 'url', 'image',
+    'specifications', 'updated_at',
+)
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def parse_since(value):
+    """
+    Parse the ISO datetime of an incremental export; naive values are in
+    the current time zone. Raises ValueError if it is malformed.
+    """
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(value)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_queryset(since=None):
+    """Return the products to export, oldest change first."""
+    promotions = SpecialPromotion.objects.filter(
+        product_id=OuterRef('pk'), is_active=True
+    ).order_by('-created_at')
+
+    products = (
+        Product.objects.select_related('category')
+        .annotate(promotion_percent=Subquery(promotions.values('discount_percent')[:1]))
+        .only(
+            'id', 'slug', 'name', 'brand', 'price', 'original_price', 'stock',
+            'is_active', 'image', 'specifications', 'updated_at', 'category__name',
+        )
+        .order_by('updated_at', 'id')
+    )
+    if since is None:
+        return products.filter(is_active=True)
+    return products.filter(Q(updated_at__gt=since) | Q(category__updated_at__gt=since))
+
+
+def export_rows(products):
+    """Yield one dict per product, reading the queryset in chunks."""
+    # reverse() per row is measurably slow on large catalogs
+    url_pattern = reverse('product_detail', kwargs={'slug': 'slug-placeholder'})
+
+    for product in products.iterator(chunk_size=CHUNK_SIZE):
+        promotion_price = None
+        if product.promotion_percent is not None:
+            promotion_price = int(product.price * (100 - product.promotion_percent) / 100)
+        yield {
+            'id': product.id,
+            'slug': product.slug,
+            'name': product.name,
+            'brand': product.brand,
+            'category': product.category.name if product.category else '',
+            'price': int(product.price),
+            'original_price': int(product.original_price) if product.original_price else None,
+            'promotion_price': promotion_price,
+            'stock': product.stock,
+            'in_stock': product.stock > 0,
+            'is_active': product.is_active,
+            'url': url_pattern.replace('slug-placeholder', product.slug),
+            'image': settings.MEDIA_URL + str(product.image) if product.image else '',
+            'specifications': product.specifications or {},
+            'updated_at': product.updated_at.isoformat(),
+        }
+
+
+# ==================== ENCODING ====================
+
+class _LineBuffer:
+    """File-like object csv.writer can write a single line into."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_COLUMNS).encode()
+    for row in rows:
+        row['specifications'] = json.dumps(row['specifications'], ensure_ascii=False)
+        yield writer.writerow([
+            '' if row[column] is None else row[column] for column in EXPORT_COLUMNS
+        ]).encode()
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield (json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode()
+
+
+def iter_gzip(chunks, batch_bytes=64 * 1024):
+    """Gzip a stream of byte chunks, yielding roughly `batch_bytes` at a time."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = []
+    size = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            pending.append(data)
+            size += len(data)
+            if size >= batch_bytes:
+                yield b''.join(pending)
+                pending = []
+                size = 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def iter_export(format='csv', since=None, compress=False):
+    """Return an iterator of bytes for the whole export."""
+    rows = export_rows(export_queryset(since))
+    chunks = iter_jsonl(rows) if format == 'jsonl' else iter_csv(rows)
+    return iter_gzip(chunks) if compress else chunks
@@ -0,0 +1,329 @@
+"""
+In-memory inverted index for the catalog listing filters.
+
+For every active product the index keeps its brand, price bucket,
+category and stock status as posting sets (facet value -> set of product
+ids) plus one id list per sort order. A listing request intersects the
+posting sets, walks the sorted list for just the requested page and then
+loads those ids from the database in a single query. Facet counts come
+from set intersections without any query at all.
+
+The index is built on first use and patched from the Product signal
+handlers in `store.signals`. Each worker keeps its own copy, so every
+change to an indexed value also bumps a version shared through
+`store.cache`: a worker whose index was built at an older version
+rebuilds before answering, instead of re-caching a just-purged page from
+stale postings. Saves that leave the indexed values alone, like an order
+lowering a stock count without selling out, bump nothing.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+
+from store import cache as store_cache
+
+
+# Rebuild from the database after this many seconds, as a fallback for
+# changes that did not go through the signal handlers.
+MAX_INDEX_AGE = 300
+
+# Shared version bumped on every product change, by any worker
+INDEX_VERSION_NAMESPACE = 'filter_index'
+
+
+def price_bucket_for(price):
+    """Return the PRICE_BUCKETS value a price falls into."""
+    from store.catalog import PRICE_BUCKETS
+
+    for value, _, price_min, price_max in PRICE_BUCKETS:
+        if (price_min is None or price >= price_min) and (price_max is None or price < price_max):
+            return value
+    return ''
+
+
+def sort_keys_for(product):
+    """Return ascending sort keys matching CatalogQuery's SORT_ORDERS."""
+    created = product.created_at.timestamp() if product.created_at else 0
+    return {
+        'asc': (product.price, product.id),
+        'desc': (-product.price, -product.id),
+        'default': (-created, -int(product.is_featured), -product.id),
+    }
+
+
+class FilterIndex:
+    """Posting sets per facet value and sorted id lists per sort order."""
+
+    facets = ('brand', 'price', 'category', 'stock')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built_at = None
+        self.version = None
+        self._reset()
+
+    def _reset(self):
+        self.all_ids = set()
+        self.postings = {facet: {} for facet in self.facets}
+        self.values_by_id = {}
+        self.sorted_keys = {'asc': [], 'desc': [], 'default': []}
+        self.keys_by_id = {}
+        self.brand_labels = {}
+        self.category_labels = {}
+
+    # ---------- building ----------
+
+    def build(self):
+        """Load every active product from the database."""
+        from store.models import Product
+
+        # Read before loading, so a change made during the build triggers another
+        version = store_cache.get_version(INDEX_VERSION_NAMESPACE)
+        products = Product.objects.filter(is_active=True).select_related('category').only(
+            'id', 'brand', 'price', 'stock', 'is_out_of_stock', 'is_featured',
+            'created_at', 'category__name',
+        )
+        with self.lock:
+            self._reset()
+            for product in products.iterator(chunk_size=2000):
+                self._add(product, sort=False)
+            for keys in self.sorted_keys.values():
+                keys.sort()
+            self.built_at = time.monotonic()
+            self.version = version
+
+    def ensure_built(self):
+        with self.lock:
+            if (
+                self.built_at is None
+                or time.monotonic() - self.built_at > MAX_INDEX_AGE
+                or store_cache.get_version(INDEX_VERSION_NAMESPACE) != self.version
+            ):
+                self.build()
+
+    def publish_change(self):
+        """
+        Tell the other workers their index is stale. Ours stays current
+        unless another worker changed something since we last synced.
+        """
+        version = store_cache.bump(INDEX_VERSION_NAMESPACE)[INDEX_VERSION_NAMESPACE]
+        with self.lock:
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+
+    def _values_for(self, product):
+        """Return {facet: value} as indexed for a product."""
+        return {
+            'brand': (product.brand or '').strip().lower(),
+            'price': price_bucket_for(product.price),
+            'category': product.category_id,
+            'stock': 'out_of_stock' if product.is_out_of_stock else 'in_stock',
+        }
+
+    def _add(self, product, sort=True):
+        brand = (product.brand or '').strip()
+        values = self._values_for(product)
+        if brand:
+            self.brand_labels.setdefault(brand.lower(), brand)
+        if product.category_id:
+            self.category_labels[product.category_id] = product.category.name
+
+        self.all_ids.add(product.id)
+        self.values_by_id[product.id] = values
+        for facet, value in values.items():
+            self.postings[facet].setdefault(value, set()).add(product.id)
+
+        keys = sort_keys_for(product)
+        self.keys_by_id[product.id] = keys
+        for sort_name, key in keys.items():
+            if sort:
+                insort(self.sorted_keys[sort_name], key)
+            else:
+                self.sorted_keys[sort_name].append(key)
+
+    def _remove(self, product_id):
+        values = self.values_by_id.pop(product_id, None)
+        if values is None:
+            return
+        self.all_ids.discard(product_id)
+        for facet, value in values.items():
+            posting = self.postings[facet].get(value)
+            if posting is not None:
+                posting.discard(product_id)
+                if not posting:
+                    del self.postings[facet][value]
+        for sort_name, key in self.keys_by_id.pop(product_id).items():
+            keys = self.sorted_keys[sort_name]
+            index = bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+
+    # ---------- incremental updates ----------
+
+    def _is_current(self, product):
+        """
+        Return True if an up-to-date copy already indexes the product with
+        the same facet values and sort keys.
+        """
+        return (
+            self.built_at is not None
+            and product.is_active
+            and self.values_by_id.get(product.id) == self._values_for(product)
+            and self.keys_by_id.get(product.id) == sort_keys_for(product)
+            and store_cache.get_version(INDEX_VERSION_NAMESPACE) == self.version
+        )
+
+    def update_product(self, product):
+        """
+        Replace a product's postings after it was saved.
+
+        Nothing is published when no indexed value changed, so a checkout
+        that only lowers the stock count does not make every other worker
+        rebuild.
+        """
+        with self.lock:
+            if self._is_current(product):
+                return
+            if self.built_at is not None:
+                self._remove(product.id)
+                if product.is_active:
+                    self._add(product)
+            self.publish_change()
+
+    def remove_product(self, product_id):
+        with self.lock:
+            if self.built_at is not None:
+                self._remove(product_id)
+            self.publish_change()
+
+    # ---------- lookup ----------
+
+    def _filter_values(self, catalog):
+        """Return {facet: value} for the filters a CatalogQuery has set."""
+        values = {}
+        if catalog.brand_filter:
+            values['brand'] = catalog.brand_filter.lower()
+        if catalog.price_filter:
+            values['price'] = catalog.price_filter
+        if catalog.category_filter:
+            values['category'] = int(catalog.category_filter)
+        if catalog.in_stock:
+            values['stock'] = 'in_stock'
+        return values
+
+    def _intersect(self, values):
+        """Return the ids matching all facet values, or None for 'all'."""
+        if not values:
+            return None
+        postings = sorted(
+            (self.postings[facet].get(value, set()) for facet, value in values.items()),
+            key=len,
+        )
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+        return result
+
+    def match(self, catalog):
+        """Return an `IndexedResult` for the CatalogQuery's filters."""
+        self.ensure_built()
+        with self.lock:
+            ids = self._intersect(self._filter_values(catalog))
+            return IndexedResult(self, ids, catalog.sort)
+
+    def page_ids(self, ids, sort, start, stop):
+        """Return ids in `ids` (None for all) at positions start:stop of `sort`."""
+        if stop <= start:
+            return []
+        with self.lock:
+            keys = self.sorted_keys[sort]
+            if ids is None:
+                return [key[-1] if sort == 'asc' else -key[-1] for key in keys[start:stop]]
+            page = []
+            position = 0
+            for key in keys:
+                product_id = key[-1] if sort == 'asc' else -key[-1]
+                if product_id in ids:
+                    if position >= start:
+                        page.append(product_id)
+                        if len(page) >= stop - start:
+                            break
+                    position += 1
+            return page
+
+    def facet_counts(self, catalog):
+        """
+        Return facet counts in the same shape as `CatalogQuery.get_facets`.
+
+        Each facet ignores its own filter but respects the others.
+        """
+        from store.catalog import PRICE_BUCKETS
+
+        self.ensure_built()
+        with self.lock:
+            filters = self._filter_values(catalog)
+            counts = {}
+            for facet in self.facets:
+                others = {name: value for name, value in filters.items() if name != facet}
+                base = self._intersect(others)
+                counts[facet] = {
+                    value: len(posting) if base is None else len(posting & base)
+                    for value, posting in self.postings[facet].items()
+                }
+
+            return {
+                'brand': [
+                    {'value': self.brand_labels[key], 'label': self.brand_labels[key], 'count': count}
+                    for key, count in sorted(counts['brand'].items())
+                    if key and count
+                ],
+                'price': [
+                    {'value': value, 'label': label, 'count': counts['price'].get(value, 0)}
+                    for value, label, _, _ in PRICE_BUCKETS
+                ],
+                'category': [
+                    {'value': category_id, 'label': self.category_labels[category_id], 'count': count}
+                    for category_id, count in sorted(
+                        counts['category'].items(), key=lambda item: self.category_labels.get(item[0], '')
+                    )
+                    if category_id and count
+                ],
+                'stock': {
+                    'in_stock': counts['stock'].get('in_stock', 0),
+                    'out_of_stock': counts['stock'].get('out_of_stock', 0),
+                },
+            }
+
+
+class IndexedResult:
+    """
+    Lazy, Paginator-compatible sequence of products from the filter index.
+
+    `len()` is answered from the index; slicing loads only that page of
+    products with one `id IN (...)` query.
+    """
+
+    def __init__(self, index, ids, sort):
+        self.index = index
+        self.ids = ids
+        self.sort = sort
+        self.total = len(index.all_ids) if ids is None else len(ids)
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, item):
+        from store.catalog import CARD_FIELDS
+        from store.models import Product
+
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop, _ = item.indices(self.total)
+        page_ids = self.index.page_ids(self.ids, self.sort, start, stop)
+        products = Product.objects.filter(id__in=page_ids, is_active=True).select_related('category').only(*CARD_FIELDS)
+        by_id = {product.id: product for product in products}
+        return [by_id[product_id] for product_id in page_ids if product_id in by_id]
+
+
+filter_index = FilterIndex()
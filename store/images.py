@@ -0,0 +1,112 @@
+"""
+Responsive image derivatives for product photos.
+
+From an uploaded original, `generate_derivatives` writes fixed-width
+copies in WebP (and AVIF when Pillow supports it) plus a JPEG fallback,
+re-encoded from pixel data so EXIF/GPS metadata is dropped, and builds a
+tiny blurred LQIP placeholder as a data URI. The file names are kept in
+`Product.image_variants` and the placeholder in `Product.image_lqip`;
+templates render them with the `product_picture` tag from `image_tags`.
+"""
+
+import base64
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps, features
+
+
+# Card tiles are ~200px wide, the detail page ~600px; 2x for dense screens
+WIDTHS = (200, 400, 800)
+
+# Output formats, best first; the last one is the <img> fallback
+FORMATS = (('avif', 'AVIF', 50), ('webp', 'WEBP', 75), ('jpeg', 'JPEG', 82))
+
+DERIVATIVES_DIR = 'products/derivatives'
+
+LQIP_WIDTH = 16
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt[0] != 'avif' or features.check('avif')]
+
+
+def open_image(field_file):
+    """Open an image file upright, in a mode every output format accepts."""
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # JPEG has no alpha: product shots go on the white card background
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def resize_to_width(image, width):
+    height = max(round(image.height * width / image.width), 1)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def encode(image, pil_format, quality):
+    buffer = io.BytesIO()
+    # No exif/icc arguments: the copies carry no metadata
+    image.save(buffer, pil_format, quality=quality, optimize=pil_format == 'JPEG')
+    return buffer.getvalue()
+
+
+def make_lqip(image):
+    """Return a ~16px blurred WebP of the image as a data URI (a few hundred bytes)."""
+    tiny = resize_to_width(image, LQIP_WIDTH).filter(ImageFilter.GaussianBlur(1))
+    return 'data:image/webp;base64,' + base64.b64encode(encode(tiny, 'WEBP', 30)).decode()
+
+
+def generate_derivatives(field_file):
+    """
+    Write the derivatives of an image; return `(variants, lqip)`.
+
+    `variants` maps a format to `{width: storage name}`, widths as strings
+    (it is stored as JSON). Widths above the original's are skipped, but
+    the original width is always produced.
+    """
+    image = open_image(field_file)
+    stem = os.path.splitext(os.path.basename(field_file.name))[0]
+    widths = [width for width in WIDTHS if width < image.width] + [min(image.width, WIDTHS[-1])]
+
+    variants = {}
+    for extension, pil_format, quality in available_formats():
+        variants[extension] = {}
+        for width in sorted(set(widths)):
+            name = f'{DERIVATIVES_DIR}/{stem}-{width}w.{extension}'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            data = encode(resize_to_width(image, width), pil_format, quality)
+            variants[extension][str(width)] = default_storage.save(name, ContentFile(data))
+    return variants, make_lqip(image)
+
+
+def process_product_image(product):
+    """Generate a product's derivatives and store them on the product."""
+    if not product.image:
+        return
+    product.image_variants, product.image_lqip = generate_derivatives(product.image)
+    # updated_at changes the product card fragment cache key
+    product.save(update_fields=['image_variants', 'image_lqip', 'updated_at'])
+
+
+def build_srcset(variants, image_format='webp'):
+    """Return the srcset attribute for one format of `image_variants`."""
+    names = (variants or {}).get(image_format, {})
+    return ', '.join(
+        f'{settings.MEDIA_URL}{name} {width}w'
+        for width, name in sorted(names.items(), key=lambda item: int(item[0]))
+    )
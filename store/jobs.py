@@ -0,0 +1,217 @@
+"""
+Background jobs without an external broker.
+
+Store code queues work with `enqueue('task.name', **payload)`, which only
+inserts a `Job` row (committed with the surrounding transaction), and
+returns at once. `manage.py run_worker` polls the table and runs the
+jobs on a thread pool:
+
+* a worker claims a job with a conditional UPDATE (pending -> running),
+  so several worker processes on the same box never run a job twice;
+* a failed job is retried with exponential backoff until `max_attempts`,
+  then stays `failed` with its traceback in `error`;
+* a job left `running` by a crashed worker is requeued after
+  `STALE_AFTER` seconds;
+* clients poll `/api/jobs/<id>/` (or `Job.status`) for the outcome.
+
+Tasks are plain functions registered with `@task('name')`; they receive
+the payload as keyword arguments and may return a JSON-serializable
+result.
+"""
+
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from store.models import Job, Product
+
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+# Seconds before a job still marked running is assumed lost
+STALE_AFTER = 15 * 60
+
+# Retry delays: RETRY_BASE * 2 ** (attempt - 1) seconds
+RETRY_BASE = 30
+
+
+class UnknownTask(Exception):
+    pass
+
+
+def task(name):
+    """Register a function as a background task."""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=3, delay=0, unique=False, **payload):
+    """
+    Queue a task to run in the worker; return the Job. With `unique`, a
+    job of the same task and payload that is still pending is returned
+    instead of queueing another one.
+    """
+    if name not in TASKS:
+        raise UnknownTask(name)
+    if unique:
+        pending = Job.objects.filter(task=name, payload=payload, status='pending').first()
+        if pending is not None:
+            return pending
+    return Job.objects.create(
+        task=name,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'task': job.task,
+        'status': job.status,
+        'attempts': job.attempts,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
+
+
+# ==================== WORKER ====================
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_stale():
+    """Put back jobs whose worker died while running them."""
+    return Job.objects.filter(
+        status='running', started_at__lt=timezone.now() - timedelta(seconds=STALE_AFTER)
+    ).update(status='pending', worker='')
+
+
+def claim_jobs(limit, worker=None):
+    """Mark up to `limit` due jobs as running for this worker and return them."""
+    worker = worker or worker_name()
+    now = timezone.now()
+    candidates = Job.objects.filter(status='pending', run_after__lte=now).order_by('run_after', 'id')
+    claimed = []
+    for job_id in candidates.values_list('id', flat=True)[:limit]:
+        # Only one worker's UPDATE matches while the job is still pending
+        if Job.objects.filter(id=job_id, status='pending').update(
+            status='running', worker=worker, started_at=now
+        ):
+            claimed.append(job_id)
+    return list(Job.objects.filter(id__in=claimed).order_by('run_after', 'id'))
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome; return the final status."""
+    job.attempts += 1
+    try:
+        func = TASKS.get(job.task)
+        if func is None:
+            raise UnknownTask(job.task)
+        result = func(**job.payload)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_BASE * 2 ** (job.attempts - 1))
+            logger.warning('Job %s (%s) failed, retrying at %s', job.id, job.task, job.run_after)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            logger.error('Job %s (%s) failed after %s attempts', job.id, job.task, job.attempts)
+    else:
+        job.status = 'done'
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'attempts', 'result', 'error', 'run_after', 'finished_at'])
+    return job.status
+
+
+def run_in_thread(job):
+    """Pool entry point: each thread uses (and cleans up) its own connection."""
+    close_old_connections()
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+# ==================== TASKS ====================
+
+@task('images.derivatives')
+def generate_image_derivatives(product_id):
+    from store.images import process_product_image
+
+    product = Product.objects.filter(id=product_id).first()
+    if product is None:
+        return {'skipped': 'deleted'}
+    process_product_image(product)
+    return {'variants': sum(len(widths) for widths in product.image_variants.values())}
+
+
+@task('related.refresh_category')
+def refresh_related_products(category_id):
+    """
+    Recompute the related products of a category. Only queued with a
+    cache backend shared with the web processes (file or database).
+    """
+    from store.related import refresh_category
+
+    return {'changed': refresh_category(category_id)}
+
+
+@task('cache.warm')
+def warm_caches(limit=20):
+    """
+    Build the quick-view payloads of the `limit` newest products and the
+    related products of their categories, so the first visitors' pages
+    are rendered from warm caches. Only useful with a cache backend
+    shared with the web processes (file or database).
+    """
+    from store.payloads import refresh_product_payload
+    from store.related import refresh_category
+
+    products = list(Product.objects.filter(is_active=True).values_list('id', 'category_id')[:limit])
+    for product_id, _ in products:
+        refresh_product_payload(product_id)
+    category_ids = {category_id for _, category_id in products}
+    for category_id in category_ids:
+        refresh_category(category_id)
+    return {'payloads': len(products), 'categories': len(category_ids)}
+
+
+@task('catalog.export')
+def export_catalog(format='csv', since=None, compress=True):
+    """Write a catalog export under MEDIA_ROOT/exports/ and return its URL."""
+    from django.conf import settings
+    from store.export import iter_export, parse_since
+
+    started_at = timezone.now()
+    filename = f'products-{started_at:%Y%m%d-%H%M%S}.{format}' + ('.gz' if compress else '')
+    directory = os.path.join(settings.MEDIA_ROOT, 'exports')
+    os.makedirs(directory, exist_ok=True)
+    size = 0
+    with open(os.path.join(directory, filename), 'wb') as f:
+        for chunk in iter_export(format, since=parse_since(since) if since else None, compress=compress):
+            f.write(chunk)
+            size += len(chunk)
+    return {
+        'url': f'{settings.MEDIA_URL}exports/{filename}',
+        'size': size,
+        'started_at': started_at.isoformat(),
+    }
@@ -0,0 +1,243 @@
+"""
+Bulk catalog loader for supplier feeds.
+
+Products are streamed from a CSV or JSON Lines file, turned into
+`Product` instances with their derived fields (slug, discount, stock
+status) computed in Python, and upserted on the slug with
+`bulk_create(update_conflicts=True)` in chunks, all inside one
+transaction. Existing products keep their id and creation date; products
+missing from the feed are left alone.
+
+Bulk inserts bypass the model signals, so `refresh_catalog_caches()` is
+called afterwards to rebuild the indexes and invalidate the caches they
+would normally maintain.
+"""
+
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from store.models import Category, Product
+from store.sync import record_changes
+
+
+# Columns a feed may provide besides `category`
+FEED_FIELDS = (
+    'name', 'slug', 'description', 'price', 'original_price', 'image', 'brand',
+    'stock', 'is_active', 'is_featured', 'discount_percent', 'storage_options',
+    'color_options', 'warranty_options', 'specifications', 'free_shipping',
+    'allow_open_box', 'return_policy_30days',
+)
+JSON_FIELDS = ('storage_options', 'color_options', 'warranty_options', 'specifications')
+BOOLEAN_FIELDS = ('is_active', 'is_featured', 'free_shipping', 'allow_open_box', 'return_policy_30days')
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class FeedError(ValueError):
+    pass
+
+
+# ==================== READING ====================
+
+def read_feed(path, format=None):
+    """Yield `(line_number, row)` from a CSV or JSONL file, one row at a time."""
+    if format is None:
+        format = 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson') else 'csv'
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as e:
+                    yield line_number, FeedError(f'JSON không hợp lệ: {e}')
+
+
+# ==================== PARSING ====================
+
+def parse_decimal(value, field, required=False):
+    if value in (None, ''):
+        if required:
+            raise FeedError(f'Thiếu {field}')
+        return None
+    try:
+        return Decimal(str(value).replace(',', ''))
+    except InvalidOperation:
+        raise FeedError(f'{field} không hợp lệ: {value!r}')
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def build_product(row, categories):
+    """
+    Turn a feed row into an unsaved Product with its derived fields set.
+
+    `categories` maps lowercased category slugs and names to Category
+    objects; unknown categories are created and added to it.
+    """
+    if not row.get('name'):
+        raise FeedError('Thiếu name')
+
+    values = {field: row[field] for field in FEED_FIELDS if row.get(field) not in (None, '')}
+    values['price'] = parse_decimal(row.get('price'), 'price', required=True)
+    if 'original_price' in values:
+        values['original_price'] = parse_decimal(values['original_price'], 'original_price')
+    try:
+        for field in ('stock', 'discount_percent'):
+            if field in values:
+                values[field] = int(values[field])
+    except (TypeError, ValueError):
+        raise FeedError('stock/discount_percent phải là số nguyên')
+    for field in BOOLEAN_FIELDS:
+        if field in values:
+            values[field] = parse_bool(values[field])
+    for field in JSON_FIELDS:
+        if isinstance(values.get(field), str):
+            try:
+                values[field] = json.loads(values[field])
+            except ValueError:
+                raise FeedError(f'{field} không phải JSON hợp lệ')
+
+    product = Product(**values)
+    category_name = (row.get('category') or '').strip()
+    if category_name:
+        product.category = get_or_create_category(category_name, categories)
+    product.fill_derived_fields()
+
+    # Only what the row provides (and what derives from it) is written to
+    # an existing product, so a feed without e.g. `is_active` keeps it
+    update_fields = set(values) - {'slug'}
+    if category_name:
+        update_fields.add('category')
+    # The price is always provided, so the discount always derives from it
+    update_fields.add('discount_percent')
+    if 'stock' in values:
+        update_fields.add('is_out_of_stock')
+    product._update_fields = frozenset(update_fields)
+    product._feed_fields = frozenset(values)
+    return product
+
+
+def apply_stored_prices(product, original_price):
+    """
+    Recompute the discount of an existing product whose row has no
+    `original_price`, against the original price it already has.
+    """
+    if 'original_price' not in product._feed_fields:
+        product.original_price = original_price
+    product.fill_derived_fields()
+    # fill_derived_fields() leaves the discount alone when not on sale
+    if not product.is_on_sale and 'discount_percent' not in product._feed_fields:
+        product.discount_percent = 0
+
+
+def get_or_create_category(name, categories):
+    slug = name.lower().replace(' ', '-')
+    category = categories.get(name.lower()) or categories.get(slug)
+    if category is None:
+        # bulk_create skips the Category signal handlers, which would
+        # recompute the category's related products on commit;
+        # refresh_catalog_caches() covers them after the load
+        category = Category(name=name, slug=slug)
+        Category.objects.bulk_create([category])
+        record_changes('category', [category.id])
+        categories[name.lower()] = categories[slug] = category
+    return category
+
+
+# ==================== LOADING ====================
+
+def upsert_products(products):
+    """Upsert a chunk on the slug; return the number of new products."""
+    # A slug repeated within one chunk would be updated twice by one statement
+    by_slug = {product.slug: product for product in products}
+    stored = dict(Product.objects.filter(slug__in=list(by_slug)).values_list('slug', 'original_price'))
+    existing = set(stored)
+    for slug, original_price in stored.items():
+        apply_stored_prices(by_slug[slug], original_price)
+
+    # One statement per set of provided columns (a CSV feed has just one)
+    groups = {}
+    for product in by_slug.values():
+        groups.setdefault(product._update_fields, []).append(product)
+    for update_fields, group in groups.items():
+        Product.objects.bulk_create(
+            group,
+            update_conflicts=True,
+            unique_fields=['slug'],
+            update_fields=sorted(update_fields) + ['updated_at'],
+        )
+
+    # bulk_create skips the signal that feeds the sync change log
+    record_changes('product', Product.objects.filter(slug__in=list(by_slug)).values_list('id', flat=True))
+    return len(by_slug) - len(existing)
+
+
+def load_catalog(rows, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Load `(line_number, row)` pairs; return a stats dict.
+
+    Invalid rows are skipped and reported in `stats['errors']`. With
+    `dry_run` every row is parsed but the transaction is rolled back.
+    """
+    stats = {'rows': 0, 'created': 0, 'updated': 0, 'errors': []}
+    categories = {}
+    for category in Category.objects.all():
+        categories[category.name.lower()] = categories[category.slug.lower()] = category
+
+    with transaction.atomic():
+        chunk = []
+        for line_number, row in rows:
+            stats['rows'] += 1
+            try:
+                if isinstance(row, FeedError):
+                    raise row
+                chunk.append(build_product(row, categories))
+            except FeedError as e:
+                stats['errors'].append((line_number, str(e)))
+                continue
+            if len(chunk) >= chunk_size:
+                created = upsert_products(chunk)
+                stats['created'] += created
+                stats['updated'] += len(chunk) - created
+                chunk = []
+        if chunk:
+            created = upsert_products(chunk)
+            stats['created'] += created
+            stats['updated'] += len(chunk) - created
+
+        if dry_run:
+            transaction.set_rollback(True)
+    return stats
+
+
+def refresh_catalog_caches():
+    """Do what the Product signal handlers would have done for a bulk load."""
+    from store import cache as store_cache
+    from store.filter_index import INDEX_VERSION_NAMESPACE, filter_index
+    from store.payloads import PAYLOAD_NAMESPACE
+    from store.related import RELATED_NAMESPACE
+    from store.search import get_search_backend
+    from store.suggest import suggest_index
+
+    get_search_backend().rebuild()
+    # Other workers rebuild their filter index on their next listing
+    store_cache.bump(INDEX_VERSION_NAMESPACE)
+    filter_index.build()
+    suggest_index.build()
+    # Cached pages, quick-view payloads, related products and ETags
+    store_cache.bump('page', PAYLOAD_NAMESPACE, RELATED_NAMESPACE)
+    store_cache.reset_epoch()
@@ -0,0 +1,272 @@
+"""
+Management command to benchmark the storefront and admin hot paths.
+
+Builds a throwaway test database, and for each catalog size seeds it with
+`seed_data` plus synthetic products, users, orders and coupons, then
+times the main views through the Django test client and prints a JSON
+report (latency percentiles and query counts per scenario) that can be
+diffed between builds. The configured database is never touched.
+
+    python manage.py benchmark --sizes 1000,10000 --iterations 30 --output bench.json
+"""
+
+import itertools
+import json
+import math
+import platform
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from store.catalog import PRICE_BUCKETS
+from store.filter_index import filter_index
+from store.models import Category, Coupon, Order, OrderItem, Product
+from store.query_budget import QueryRecorder
+from store.search import get_search_backend, reset_search_backend
+from store.suggest import suggest_index
+
+
+BRANDS = ('Apple', 'Samsung', 'Xiaomi', 'OPPO', 'vivo', 'realme', 'Honor', 'Tecno')
+MODELS = ('Pro', 'Max', 'Ultra', 'Lite', 'Plus', 'Neo', 'Edge', 'Mini')
+STORAGES = ('64GB', '128GB', '256GB', '512GB', '1TB')
+
+BATCH_SIZE = 2000
+
+
+# ==================== DATA ====================
+
+def generate_products(count, categories, rng):
+    """Bulk insert `count` synthetic products, computing what `Product.save()` would."""
+    now = timezone.now()
+    batch = []
+    for number in range(count):
+        brand = rng.choice(BRANDS)
+        name = f'{brand} {rng.choice(MODELS)} {number} {rng.choice(STORAGES)}'
+        price = Decimal(rng.randrange(1_000_000, 45_000_000, 10_000))
+        original_price = price * Decimal('1.2') if rng.random() < 0.3 else None
+        stock = rng.choice((0, 5, 20, 100))
+        batch.append(Product(
+            name=name,
+            slug=f'bench-{number}',
+            description=f'{name} synthetic benchmark product.',
+            price=price,
+            original_price=original_price,
+            discount_percent=int((1 - price / original_price) * 100) if original_price else 0,
+            image='',
+            category=rng.choice(categories),
+            brand=brand,
+            stock=stock,
+            is_out_of_stock=stock == 0,
+            is_featured=rng.random() < 0.05,
+            specifications={'Chip': f'{brand} X{number % 10}', 'RAM': rng.choice(('4GB', '8GB', '12GB'))},
+            created_at=now - timedelta(minutes=number),
+        ))
+        if len(batch) >= BATCH_SIZE:
+            Product.objects.bulk_create(batch)
+            batch = []
+    Product.objects.bulk_create(batch)
+
+
+def generate_users(count, rng):
+    """Create customers with a few orders each; return (customer, staff)."""
+    password = make_password('benchmark')
+    User.objects.bulk_create([
+        User(username=f'bench{number}', email=f'bench{number}@example.com', password=password)
+        for number in range(count)
+    ], batch_size=BATCH_SIZE)
+
+    product_ids = list(Product.objects.values_list('id', flat=True)[:500])
+    statuses = [status for status, _ in Order.STATUS_CHOICES]
+    orders = [
+        Order(user_id=user_id, status=rng.choice(statuses), total_amount=0)
+        for user_id in User.objects.filter(username__startswith='bench').values_list('id', flat=True)
+        for _ in range(rng.randint(0, 4))
+    ]
+    Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+
+    items = []
+    for order_id in Order.objects.values_list('id', flat=True):
+        for _ in range(rng.randint(1, 3)):
+            items.append(OrderItem(
+                order_id=order_id, product_id=rng.choice(product_ids),
+                product_name='Benchmark item', product_price=Decimal(9_990_000), quantity=rng.randint(1, 2),
+            ))
+    OrderItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+
+    # The profile scenario uses the customer with the most history
+    customer = User.objects.get(username='bench0')
+    Order.objects.bulk_create([Order(user=customer, total_amount=9_990_000) for _ in range(20)])
+
+    staff = User.objects.create(username='bench-staff', password=password, is_staff=True, is_superuser=True)
+    return customer, staff
+
+
+def generate_coupons(count):
+    now = timezone.now()
+    Coupon.objects.bulk_create([
+        Coupon(
+            code=f'BENCH{number}', name=f'Benchmark {number}', discount_type='percent',
+            discount_value=10, start_date=now - timedelta(days=1), end_date=now + timedelta(days=30),
+            usage_limit=1000,
+        )
+        for number in range(count)
+    ])
+
+
+def build_catalog(size, rng, stdout):
+    call_command('seed_data', stdout=stdout)
+    categories = list(Category.objects.all())
+    generate_products(max(size - Product.objects.count(), 0), categories, rng)
+    customer, staff = generate_users(max(size // 100, 10), rng)
+    generate_coupons(max(size // 1000, 5))
+
+    # Bulk inserts skip the signal handlers that keep the indexes in sync
+    reset_search_backend()
+    get_search_backend().rebuild()
+    filter_index.build()
+    suggest_index.build()
+    return customer, staff
+
+
+# ==================== SCENARIOS ====================
+
+def listing_queries():
+    """Every filter combination crossed with every sort order."""
+    filters = [
+        {},
+        {'brand': 'Apple'},
+        {'price': PRICE_BUCKETS[3][0]},
+        {'brand': 'Samsung', 'price': PRICE_BUCKETS[5][0]},
+        {'in_stock': '1'},
+        {'q': 'pro'},
+        {'page': '5'},
+    ]
+    for params, sort in itertools.product(filters, ('default', 'asc', 'desc')):
+        yield dict(params, sort=sort)
+
+
+def scenarios(customer, staff, rng):
+    """Return `[(name, client, urls), ...]`; each iteration cycles through `urls`."""
+    anonymous = Client()
+    logged_in = Client()
+    logged_in.force_login(customer)
+    admin = Client()
+    admin.force_login(staff)
+
+    products = rng.sample(list(Product.objects.filter(is_active=True).values_list('id', 'slug')), 50)
+    result = [
+        ('home', anonymous, ['/']),
+        ('home (logged in)', logged_in, ['/']),
+        ('product_detail', anonymous, [f'/product/{slug}/' for _, slug in products]),
+        ('get_product_details', anonymous, [f'/api/product/{product_id}/' for product_id, _ in products]),
+        ('profile', logged_in, ['/profile/']),
+        ('admin_dashboard', admin, ['/qhun22/']),
+    ]
+    for params in listing_queries():
+        query = '&'.join(f'{key}={value}' for key, value in sorted(params.items()))
+        result.append((f'api_products?{query}', anonymous, [f'/api/products/?{query}']))
+    return result
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list."""
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+def run_scenario(client, urls, iterations):
+    timings = []
+    queries = []
+    for iteration in range(iterations):
+        url = urls[iteration % len(urls)]
+        with QueryRecorder() as recorder:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        queries.append(recorder.count)
+
+    timings.sort()
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries_max': max(queries),
+        'queries_first': queries[0],
+    }
+
+
+# ==================== COMMAND ====================
+
+class Command(BaseCommand):
+    help = 'Benchmark the storefront and admin views on synthetic catalogs (JSON report)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma-separated catalog sizes (products)')
+        parser.add_argument('--iterations', type=int, default=30,
+                            help='Requests per scenario')
+        parser.add_argument('--seed', type=int, default=22,
+                            help='Random seed for the synthetic data')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Run with a dummy cache to time the uncached code paths')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+                'cache': 'dummy' if options['no_cache'] else caches['default'].__class__.__name__,
+            },
+            'results': {},
+        }
+
+        cache_settings = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for size in sizes:
+                self.stderr.write(f'Benchmarking {size} products...')
+                call_command('flush', interactive=False, verbosity=0)
+                caches['default'].clear()
+                with override_settings(**({'CACHES': cache_settings} if options['no_cache'] else {})):
+                    rng = random.Random(options['seed'])
+                    customer, staff = build_catalog(size, rng, self.stderr)
+                    report['results'][str(size)] = {
+                        name: run_scenario(client, urls, options['iterations'])
+                        for name, client, urls in scenarios(customer, staff, rng)
+                    }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            reset_search_backend()
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+        else:
+            self.stdout.write(output)
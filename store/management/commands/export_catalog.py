@@ -0,0 +1,49 @@
+"""
+Management command to export the product catalog as a feed file.
+
+    python manage.py export_catalog --output products.csv.gz --gzip
+    python manage.py export_catalog --format jsonl --since 2026-01-01T00:00:00
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.export import FORMATS, iter_export, parse_since
+
+
+class Command(BaseCommand):
+    help = 'Stream the product catalog to a CSV or JSONL file (optionally gzipped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--since', help='Only products changed after this ISO datetime')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError:
+                raise CommandError('--since must be an ISO datetime')
+
+        started_at = timezone.now()
+        chunks = iter_export(options['format'], since=since, compress=options['gzip'])
+        size = 0
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+                size += len(chunk)
+            sys.stdout.buffer.flush()
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {size} bytes. Next incremental export: --since {started_at.isoformat()}'
+        ))
@@ -0,0 +1,31 @@
+"""
+Management command to build responsive image derivatives for existing products.
+"""
+
+from django.core.management.base import BaseCommand
+
+from store.images import process_product_image
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate WebP/AVIF/JPEG derivatives and LQIP placeholders for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate products that already have derivatives')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='')
+        if not options['force']:
+            products = products.filter(image_variants={})
+
+        done = failed = 0
+        for product in products.iterator(chunk_size=200):
+            try:
+                process_product_image(product)
+                done += 1
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(self.style.WARNING(f'  {product.slug}: {e}'))
+        self.stdout.write(self.style.SUCCESS(f'Processed {done} product images, {failed} failed'))
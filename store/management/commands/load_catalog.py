@@ -0,0 +1,61 @@
+"""
+Management command to bulk load products from a supplier feed.
+
+    python manage.py load_catalog feed.csv
+    python manage.py load_catalog feed.jsonl --chunk-size 2000 --dry-run
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.loader import DEFAULT_CHUNK_SIZE, load_catalog, read_feed, refresh_catalog_caches
+
+
+class Command(BaseCommand):
+    help = 'Upsert products from a CSV or JSONL feed (matched on slug) in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Feed format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows per INSERT ... ON CONFLICT statement')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Parse and load inside a transaction that is rolled back')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            stats = load_catalog(
+                read_feed(options['path'], options['format']),
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+            )
+        except OSError as e:
+            raise CommandError(f'Không đọc được file: {e}')
+        loaded_at = time.perf_counter()
+
+        if not options['dry_run']:
+            refresh_catalog_caches()
+        elapsed = time.perf_counter() - started
+
+        for line_number, message in stats['errors'][:20]:
+            self.stderr.write(self.style.WARNING(f'  Line {line_number}: {message}'))
+        if len(stats['errors']) > 20:
+            self.stderr.write(self.style.WARNING(f'  ... {len(stats["errors"]) - 20} more invalid rows'))
+
+        load_time = loaded_at - started
+        self.stdout.write(self.style.SUCCESS(
+            '{prefix}{rows} rows: {created} created, {updated} updated, {errors} skipped '
+            'in {load:.2f}s ({rate:.0f} rows/s), caches refreshed in {refresh:.2f}s'.format(
+                prefix='[dry run] ' if options['dry_run'] else '',
+                rows=stats['rows'],
+                created=stats['created'],
+                updated=stats['updated'],
+                errors=len(stats['errors']),
+                load=load_time,
+                rate=stats['rows'] / load_time if load_time else 0,
+                refresh=elapsed - load_time,
+            )
+        ))
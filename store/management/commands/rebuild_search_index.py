@@ -0,0 +1,17 @@
+"""
+Management command to rebuild the product search index.
+"""
+
+from django.core.management.base import BaseCommand
+from store.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} products with {backend.__class__.__name__}'
+        ))
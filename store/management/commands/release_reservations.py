@@ -0,0 +1,29 @@
+"""
+Management command releasing expired checkout stock holds.
+
+    python manage.py release_reservations               # once, e.g. from cron
+    python manage.py release_reservations --interval 30 # keep sweeping
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.checkout import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stock reservations in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Sweep every N seconds instead of once')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired()
+            if released or not options['interval']:
+                self.stdout.write(f'Released {released} expired reservations')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
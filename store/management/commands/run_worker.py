@@ -0,0 +1,81 @@
+"""
+Management command running queued background jobs (see store.jobs).
+
+    python manage.py run_worker --threads 4
+    python manage.py run_worker --once      # drain the queue and exit
+
+Several workers may run side by side; each job is claimed by exactly one.
+"""
+
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from store import cache as store_cache
+from store.jobs import claim_jobs, requeue_stale, run_in_thread, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs on a thread pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Jobs run concurrently (default 4)')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between polls of an empty queue')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        threads = max(options['threads'], 1)
+        worker = worker_name()
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.stdout.write(f'Worker {worker} started with {threads} threads')
+        if not store_cache.is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The cache backend is local to this process: cache jobs (cache.warm, '
+                'related.refresh_category) will not reach the web processes. '
+                'Set STORE_CACHE_BACKEND=file or db.'
+            ))
+        done = failed = 0
+        running = set()
+        last_stale_check = 0
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while not self.stopping:
+                if time.monotonic() - last_stale_check > 60:
+                    requeue_stale()
+                    last_stale_check = time.monotonic()
+
+                free = threads - len(running)
+                jobs = claim_jobs(free, worker) if free else []
+                for job in jobs:
+                    running.add(pool.submit(run_in_thread, job))
+                    self.stdout.write(f'  #{job.id} {job.task}')
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                finished, running = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future.result() == 'done':
+                        done += 1
+                    else:
+                        failed += 1
+
+            # Let claimed jobs finish rather than leaving them to the stale check
+            for future in running:
+                if future.result() == 'done':
+                    done += 1
+                else:
+                    failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Worker stopped: {done} done, {failed} failed or retrying'))
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping after the running jobs...')
+        self.stopping = True
@@ -0,0 +1,199 @@
+"""
+Latency metrics for the store views.
+
+`MetricsMiddleware` times every request and splits it into stages:
+
+* ``view``: the whole request, middleware included;
+* ``db``: SQL execution, through `connection.execute_wrapper`;
+* ``template``: template rendering, through the `DjangoTemplates`
+  backend below (configured in ``TEMPLATES``);
+* ``json``: JSON encoding, through `TimedJSONEncoder`.
+
+Each (URL name, stage) pair keeps an in-memory log-bucketed histogram
+(each bucket is ~41% wider than the previous one, so relative error stays
+bounded from sub-millisecond to minute-long requests). The histograms are
+per process and served in the Prometheus text format by the staff-only
+`/qhun22/metrics/` view.
+
+Slow requests can also be profiled: with ``STORE_PROFILE_SAMPLE_RATE`` > 0
+that fraction of requests runs under cProfile, and those slower than
+``STORE_PROFILE_SLOW_MS`` are dumped to ``STORE_PROFILE_DIR`` for
+`python -m pstats`.
+"""
+
+import cProfile
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+
+# Bucket upper bounds in seconds: 0.5 ms * sqrt(2)^i, up to ~90 s
+BUCKET_BOUNDS = tuple(0.0005 * 2 ** (i / 2) for i in range(36))
+
+
+# ==================== HISTOGRAMS ====================
+
+class Histogram:
+    """Fixed log-spaced buckets with a running sum and count."""
+
+    def __init__(self):
+        # One extra bucket for values above the last bound (+Inf)
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class Registry:
+    """Histograms per (URL name, stage), shared by every thread of the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def record(self, view, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get((view, stage))
+            if histogram is None:
+                histogram = self.histograms[(view, stage)] = Histogram()
+            histogram.record(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def render_prometheus(self):
+        """Return every histogram in the Prometheus text exposition format."""
+        name = 'store_request_duration_seconds'
+        lines = [
+            f'# HELP {name} Time spent per request stage, by URL name.',
+            f'# TYPE {name} histogram',
+        ]
+        with self.lock:
+            for (view, stage), histogram in sorted(self.histograms.items()):
+                labels = f'view="{view}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(BUCKET_BOUNDS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{{labels}}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+# ==================== PER-REQUEST STAGES ====================
+
+_local = threading.local()
+
+
+@contextmanager
+def stage(name):
+    """Add the block's duration to a stage of the current request, if any."""
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def time_query(execute, sql, params, many, context):
+    with stage('db'):
+        return execute(sql, params, many, context)
+
+
+class TimedJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder that counts its time in the 'json' stage."""
+
+    def encode(self, o):
+        with stage('json'):
+            return super().encode(o)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with stage('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, counting render time in the 'template' stage."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+# ==================== MIDDLEWARE ====================
+
+def should_profile():
+    rate = getattr(settings, 'STORE_PROFILE_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+def dump_profile(profiler, view, elapsed):
+    directory = getattr(settings, 'STORE_PROFILE_DIR', None) or os.path.join(settings.BASE_DIR, 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    filename = '{}-{}-{}ms.prof'.format(view or 'unknown', time.strftime('%Y%m%d-%H%M%S'), int(elapsed * 1000))
+    profiler.dump_stats(os.path.join(directory, filename))
+
+
+class MetricsMiddleware:
+    """Record per-stage request latencies and profile sampled slow requests."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.timings = {}
+        profiler = cProfile.Profile() if should_profile() else None
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(time_query):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+            elapsed = time.perf_counter() - started
+            timings = _local.timings
+        finally:
+            _local.timings = None
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unresolved'
+        registry.record(view, 'view', elapsed)
+        for name, seconds in timings.items():
+            registry.record(view, name, seconds)
+
+        threshold = getattr(settings, 'STORE_PROFILE_SLOW_MS', 500) / 1000
+        if profiler is not None and elapsed >= threshold:
+            dump_profile(profiler, view, elapsed)
+        return response
@@ -0,0 +1,85 @@
+import unicodedata
+
+from django.db import migrations
+
+
+# Frozen copies of store.search.FTS_TABLE and the document builder, so the
+# migration keeps working if the app code changes
+FTS_TABLE = 'store_product_search'
+
+
+def fold_text(text):
+    if not text:
+        return ''
+    text = str(text).replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.lower()
+
+
+def flatten_specifications(specifications):
+    if isinstance(specifications, dict):
+        parts = []
+        for key, value in specifications.items():
+            parts.append(str(key))
+            parts.append(flatten_specifications(value))
+        return ' '.join(part for part in parts if part)
+    if isinstance(specifications, (list, tuple)):
+        return ' '.join(flatten_specifications(value) for value in specifications)
+    if specifications is None:
+        return ''
+    return str(specifications)
+
+
+def product_document(product):
+    category_name = product.category.name if product.category_id else ''
+    return (
+        fold_text(product.name),
+        fold_text(product.brand),
+        fold_text(category_name),
+        fold_text(flatten_specifications(product.specifications)),
+    )
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 product search table (SQLite only)."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if not cursor.fetchone()[0]:
+            return
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            f"USING fts5(name, brand, category, specs, tokenize = 'unicode61')"
+        )
+
+        Product = apps.get_model('store', 'Product')
+        rows = [
+            (product.id,) + product_document(product)
+            for product in Product.objects.filter(is_active=True).select_related('category')
+        ]
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, brand, category, specs) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+def seed_catalog_changes(apps, schema_editor):
+    """Log every existing object once, so syncing from token 0 gets the full catalog."""
+    CatalogChange = apps.get_model('store', 'CatalogChange')
+    for entity, model_name in (('category', 'Category'), ('product', 'Product'), ('promotion', 'SpecialPromotion')):
+        model = apps.get_model('store', model_name)
+        ids = model.objects.order_by('id').values_list('id', flat=True)
+        CatalogChange.objects.bulk_create(
+            [CatalogChange(entity=entity, object_id=object_id, action='upsert') for object_id in ids],
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('product', 'Sản phẩm'), ('category', 'Danh mục'), ('promotion', 'Khuyến mãi đặc biệt')], max_length=20, verbose_name='Đối tượng')),
+                ('object_id', models.PositiveIntegerField(verbose_name='ID đối tượng')),
+                ('action', models.CharField(choices=[('upsert', 'Thêm/Cập nhật'), ('delete', 'Xóa')], max_length=10, verbose_name='Thao tác')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Thời điểm')),
+            ],
+            options={
+                'verbose_name': 'Thay đổi danh mục sản phẩm',
+                'verbose_name_plural': 'Thay đổi danh mục sản phẩm',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(seed_catalog_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_catalog_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_lqip',
+            field=models.TextField(blank=True, verbose_name='Ảnh xem trước'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Ảnh theo kích thước'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0015_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('storage', models.CharField(blank=True, max_length=100, verbose_name='Bộ nhớ')),
+                ('color', models.CharField(blank=True, max_length=100, verbose_name='Màu sắc')),
+                ('warranty', models.CharField(blank=True, max_length=100, verbose_name='Bảo hành')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Số lượng')),
+                ('added_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày thêm')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_items', to='store.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sản phẩm trong giỏ',
+                'verbose_name_plural': 'Sản phẩm trong giỏ',
+                'ordering': ['added_at', 'id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product', 'storage', 'color', 'warranty'), name='cart_item_unique_line'),
+        ),
+    ]
@@ -4,6 +4,7 @@ Store application models for ShopMobile.
 
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
 
@@ -100,6 +101,16 @@ class Product(models.Model):
         upload_to='products/',
         verbose_name='Hình ảnh'
     )
+    # Resized WebP/AVIF/JPEG copies and blurred placeholder (see store.images)
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Ảnh theo kích thước'
+    )
+    image_lqip = models.TextField(
+        blank=True,
+        verbose_name='Ảnh xem trước'
+    )
     category = models.ForeignKey(
         Category,
         on_delete=models.SET_NULL,
@@ -182,12 +193,25 @@ class Product(models.Model):
         verbose_name = 'Sản phẩm'
         verbose_name_plural = 'Sản phẩm'
         ordering = ['-created_at', '-is_featured']
+        indexes = [
+            # Keyset pagination for /api/products/ (see store.catalog)
+            models.Index(fields=['is_active', 'price', 'id'], name='product_active_price_idx'),
+            models.Index(fields=['is_active', 'created_at', 'is_featured', 'id'], name='product_active_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
         """Auto-generate slug and calculate discount."""
+        self.fill_derived_fields()
+        super().save(*args, **kwargs)
+
+    def fill_derived_fields(self):
+        """
+        Set the fields computed from the others: slug, discount and stock status.
+        Also used by bulk loaders, which bypass save().
+        """
         if not self.slug:
             self.slug = self.name.lower().replace(' ', '-').replace('+', '-')
         
@@ -199,8 +223,6 @@ class Product(models.Model):
         
         # Auto-set is_out_of_stock based on stock
         self.is_out_of_stock = (self.stock == 0)
-        
-        super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         """Return product detail URL."""
@@ -271,6 +293,7 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default='cod')
     shipping_address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True, blank=True)
     total_amount = models.DecimalField(max_digits=15, decimal_places=0, default=0)
+    discount_amount = models.DecimalField(max_digits=15, decimal_places=0, default=0, verbose_name='Giảm giá')
     note = models.TextField(blank=True, verbose_name='Ghi chú')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Cập nhật lần cuối')
@@ -328,6 +351,59 @@ class OrderItem(models.Model):
         return self.product_price * self.quantity
 
 
+class CartItem(models.Model):
+    """
+    Shopping cart line of a logged-in user. Anonymous carts live in the
+    session and are merged into these rows on login (see store.cart).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
+    storage = models.CharField(max_length=100, blank=True, verbose_name='Bộ nhớ')
+    color = models.CharField(max_length=100, blank=True, verbose_name='Màu sắc')
+    warranty = models.CharField(max_length=100, blank=True, verbose_name='Bảo hành')
+    quantity = models.PositiveIntegerField(default=1, verbose_name='Số lượng')
+    added_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày thêm')
+
+    class Meta:
+        verbose_name = 'Sản phẩm trong giỏ'
+        verbose_name_plural = 'Sản phẩm trong giỏ'
+        ordering = ['added_at', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'product', 'storage', 'color', 'warranty'],
+                name='cart_item_unique_line',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.product_id} x {self.quantity}'
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a user during checkout until `expires_at`; other buyers
+    only see the product's stock minus the active holds (see store.checkout).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField(verbose_name='Số lượng')
+    expires_at = models.DateTimeField(verbose_name='Hết hạn')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+
+    class Meta:
+        verbose_name = 'Giữ hàng'
+        verbose_name_plural = 'Giữ hàng'
+        ordering = ['expires_at']
+        indexes = [
+            # Covers the active-holds SUM per product and the expiry sweep
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='reservation_active_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.product_id} x {self.quantity} (đến {self.expires_at:%H:%M})'
+
+
 class Coupon(models.Model):
     """
     Coupon model for discount codes.
@@ -420,6 +496,36 @@ class Coupon(models.Model):
         )
 
 
+class CouponRedemption(models.Model):
+    """
+    One use of a coupon by a user (see store.coupons). Cancelling it gives
+    the use back to the coupon; a user may hold one active use per coupon.
+    """
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coupon_redemptions')
+    order = models.OneToOneField(
+        Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='coupon_redemption'
+    )
+    discount_amount = models.DecimalField(max_digits=15, decimal_places=0, verbose_name='Số tiền giảm')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày sử dụng')
+    cancelled_at = models.DateTimeField(null=True, blank=True, verbose_name='Ngày hoàn lại')
+
+    class Meta:
+        verbose_name = 'Lượt dùng mã giảm giá'
+        verbose_name_plural = 'Lượt dùng mã giảm giá'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['coupon', 'user'],
+                condition=models.Q(cancelled_at__isnull=True),
+                name='coupon_redemption_one_per_user',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.coupon.code} - {self.user.username}'
+
+
 class SpecialPromotion(models.Model):
     """
     Special promotion model for featured products on home page (max 5).
@@ -465,3 +571,72 @@ class SpecialPromotion(models.Model):
         if not self.pk and SpecialPromotion.objects.count() >= 5:
             raise ValueError('Chỉ được phép có tối đa 5 khuyến mãi đặc biệt')
         super().save(*args, **kwargs)
+
+
+class CatalogChange(models.Model):
+    """
+    Append-only log of catalog changes, read by the incremental sync API.
+    The auto-increment id is the sync token.
+    """
+    ENTITY_CHOICES = [
+        ('product', 'Sản phẩm'),
+        ('category', 'Danh mục'),
+        ('promotion', 'Khuyến mãi đặc biệt'),
+    ]
+
+    ACTION_CHOICES = [
+        ('upsert', 'Thêm/Cập nhật'),
+        ('delete', 'Xóa'),
+    ]
+
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES, verbose_name='Đối tượng')
+    object_id = models.PositiveIntegerField(verbose_name='ID đối tượng')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name='Thao tác')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Thời điểm')
+
+    class Meta:
+        verbose_name = 'Thay đổi danh mục sản phẩm'
+        verbose_name_plural = 'Thay đổi danh mục sản phẩm'
+        ordering = ['id']
+
+    def __str__(self):
+        return f'#{self.id} {self.action} {self.entity} {self.object_id}'
+
+
+class Job(models.Model):
+    """
+    Background task queued by the store and run by `manage.py run_worker`
+    (see store.jobs).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Đang chờ'),
+        ('running', 'Đang chạy'),
+        ('done', 'Hoàn thành'),
+        ('failed', 'Thất bại'),
+    ]
+
+    task = models.CharField(max_length=100, verbose_name='Tác vụ')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Tham số')
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='Trạng thái'
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Số lần chạy')
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name='Số lần chạy tối đa')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='Chạy sau')
+    result = models.JSONField(null=True, blank=True, verbose_name='Kết quả')
+    error = models.TextField(blank=True, verbose_name='Lỗi')
+    worker = models.CharField(max_length=100, blank=True, verbose_name='Worker')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Bắt đầu')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Kết thúc')
+
+    class Meta:
+        verbose_name = 'Tác vụ nền'
+        verbose_name_plural = 'Tác vụ nền'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'#{self.id} {self.task} ({self.status})'
@@ -0,0 +1,161 @@
+"""
+Full-response cache for anonymous catalog pages.
+
+Cached pages are keyed on the view name, its URL kwargs, the normalized
+listing parameters and the current version of each of the page's tags.
+Purging a tag bumps its version, so every page carrying that tag misses
+on its next request without having to know the individual keys.
+
+Responses are only cached for anonymous GET requests with no pending
+Django messages, and never when the render used a CSRF token or set a
+cookie.
+"""
+
+import hashlib
+import json
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.http import HttpResponse
+
+from store import cache as store_cache
+from store.cart import cart_count
+from store.catalog import CatalogQuery
+
+
+# ==================== TAGS ====================
+
+def tag_versions(tags):
+    """Return the current version of each tag."""
+    versions = store_cache.get_versions(['tag:' + tag for tag in tags])
+    return [versions['tag:' + tag] for tag in tags]
+
+
+def purge_tags(*tags):
+    """Invalidate every cached page carrying any of the given tags."""
+    store_cache.bump(*('tag:' + tag for tag in tags))
+
+
+def fragment_version(tag):
+    """
+    Return a template fragment cache key part that changes whenever the
+    tag is purged (or the cache epoch is reset), without any query.
+    """
+    return '{}-{}'.format(store_cache.get_epoch(), tag_versions([tag])[0])
+
+
+def brand_tag(brand):
+    return 'listing:brand:' + (brand or '').strip().lower()
+
+
+def listing_tags(catalog):
+    """
+    Return the tags of a home listing page.
+
+    Every listing carries 'listing:all': even a brand-filtered page renders
+    the brand and price facets, which count products of every brand.
+    """
+    tags = ['promotions', 'categories', 'listing:all']
+    if catalog.brand_filter:
+        tags.append(brand_tag(catalog.brand_filter))
+    return tags
+
+
+def product_tag(slug):
+    return 'product:' + slug
+
+
+# ==================== KEYS ====================
+
+def listing_params(request):
+    """Return the normalized listing parameters of a request."""
+    catalog = CatalogQuery(request.GET)
+    params = catalog.get_filters()
+    # The brand filter is case-insensitive (brand__iexact)
+    params['brand'] = params['brand'].lower()
+    params['page'] = str(catalog.page_number)
+    return catalog, params
+
+
+def home_cache_key(request):
+    """Return `(key_parts, tags)` for a home page request."""
+    catalog, params = listing_params(request)
+    return params, listing_tags(catalog)
+
+
+def product_detail_cache_key(request, slug):
+    """Return `(key_parts, tags)` for a product detail request."""
+    return {'slug': slug}, [product_tag(slug)]
+
+
+def page_digest(name, parts, tags):
+    raw = json.dumps([name, parts, tags, tag_versions(tags)], sort_keys=True)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+# ==================== DECORATOR ====================
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Pending messages are rendered into the page by base.html
+    if len(get_messages(request)):
+        return False
+    # So is the cart badge, which the cached copy shows as empty
+    if cart_count(request):
+        return False
+    return True
+
+
+def is_cacheable_response(request, response):
+    if response.status_code != 200 or response.streaming:
+        return False
+    if response.cookies or response.has_header('Set-Cookie'):
+        return False
+    # The page embeds a per-visitor CSRF token
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return False
+    return True
+
+
+def anonymous_page_cache(key_func, timeout=None):
+    """
+    Cache a view's full response for anonymous visitors.
+
+    `key_func(request, *args, **kwargs)` returns `(key_parts, tags)`.
+    `timeout` defaults to the 'page' TTL policy of `store.cache`.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            parts, tags = key_func(request, *args, **kwargs)
+            digest = page_digest(view_func.__name__, parts, tags)
+            cached = store_cache.get('page', view_func.__name__, digest)
+            if cached is not None:
+                response = HttpResponse(cached['content'], status=cached['status'])
+                for header, value in cached['headers'].items():
+                    response[header] = value
+                response['X-Page-Cache'] = 'HIT'
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+            if is_cacheable_response(request, response):
+                store_cache.set('page', view_func.__name__, digest, value={
+                    'content': response.content,
+                    'status': response.status_code,
+                    'headers': {
+                        header: value for header, value in response.items()
+                        if header.lower() in ('content-type', 'content-language')
+                    },
+                }, ttl=timeout)
+                response['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,83 @@
+"""
+Precomputed JSON payloads for the product quick-view API.
+
+`/api/product/<id>/` is opened for every quick-view modal on the home
+page. Its response body is built once, stored in the cache as ready to
+send bytes together with an ETag, and rebuilt by the signal handlers in
+`store.signals` when the product, its promotion or its category changes.
+"""
+
+import hashlib
+import json
+
+from django.db.models import OuterRef, Subquery
+
+from store import cache as store_cache
+from store.metrics import TimedJSONEncoder
+from store.models import Product, SpecialPromotion
+
+
+PAYLOAD_NAMESPACE = 'product:payload'
+
+
+def build_product_payload(product_id):
+    """
+    Build the quick-view payload for a product with a single query.
+
+    Returns `{'body': bytes, 'etag': str}`, or None if the product does
+    not exist.
+    """
+    promotion = SpecialPromotion.objects.filter(
+        product_id=OuterRef('pk'), is_active=True
+    ).order_by('-created_at').values('discount_percent')[:1]
+
+    product = (
+        Product.objects.select_related('category')
+        .annotate(promotion_percent=Subquery(promotion))
+        .filter(id=product_id)
+        .first()
+    )
+    if product is None:
+        return None
+
+    discounted_price = None
+    if product.promotion_percent is not None:
+        discounted_price = float(product.price * (100 - product.promotion_percent) / 100)
+
+    data = {
+        'success': True,
+        'product': {
+            'id': product.id,
+            'name': product.name,
+            'brand': product.brand,
+            'price': float(product.price),
+            'original_price': float(product.original_price) if product.original_price else None,
+            'discounted_price': discounted_price,
+            'discount_percent': product.promotion_percent,
+            'image': str(product.image),
+            'description': product.description,
+            'stock': product.stock,
+            'is_active': product.is_active,
+            'category_name': product.category.name if product.category else '',
+        }
+    }
+    body = json.dumps(data, cls=TimedJSONEncoder).encode()
+    return {'body': body, 'etag': '"%s"' % hashlib.md5(body).hexdigest()}
+
+
+def get_product_payload(product_id):
+    """Return the cached payload for a product, building it on a miss."""
+    return store_cache.get_or_set(
+        PAYLOAD_NAMESPACE, product_id,
+        producer=lambda: build_product_payload(product_id),
+    )
+
+
+def refresh_product_payload(product_id):
+    """Rebuild a product's payload after it or its promotion changed."""
+    store_cache.set(PAYLOAD_NAMESPACE, product_id, value=build_product_payload(product_id))
+
+
+def invalidate_all_payloads():
+    """Drop every payload, e.g. after a category rename."""
+    store_cache.bump(PAYLOAD_NAMESPACE)
@@ -0,0 +1,184 @@
+"""
+Per-view SQL query budgets.
+
+Every view in `store.urls` declares how many queries one request may run
+(`QUERY_BUDGETS`, keyed by URL name). `QueryRecorder` counts the queries
+run on the default connection, their total time and how often the same
+statement was repeated, which is how an N+1 shows up. Savepoint
+statements are not counted: tests run every request inside a
+transaction, where each `atomic()` block adds two of them.
+
+`QueryBudgetMiddleware` is opt-in (`STORE_QUERY_BUDGET` in settings):
+
+* ``'warn'``: a request over budget logs a warning;
+* ``'strict'``: a request over budget raises `QueryBudgetExceeded`.
+
+Either way each response gets `X-Query-Count`, `X-Query-Time-Ms` and
+`X-Query-Budget` headers, and a JSON summary of the request is logged to
+the `store.query_budget` logger. Tests use `assert_query_budget` from
+`store.testing` instead.
+"""
+
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger('store.query_budget')
+
+# Queries a single request of each view may run. Includes the session
+# and user lookups of a logged-in request.
+QUERY_BUDGETS = {
+    'home': 8,
+    'product_detail': 5,
+    'register': 6,
+    'login': 6,
+    'forgot_password': 4,
+    'profile': 10,
+    'change_password': 6,
+    'feedback': 4,
+    'add_address': 8,
+    'set_default_address': 8,
+    'delete_address': 6,
+    'get_product_details': 3,
+    'cart': 6,
+    'cart_add': 6,
+    'cart_update': 6,
+    'cart_remove': 6,
+    'checkout': 16,
+    'api_cart': 5,
+    'api_validate_coupon': 1,
+    'api_products': 5,
+    'api_search_suggest': 4,
+    'export_products': 3,
+    'api_sync': 5,
+    'api_job_status': 3,
+    'admin_dashboard': 16,
+    'admin_metrics': 3,
+    'enqueue_job': 3,
+    'admin_promotions': 6,
+    'add_promotion': 8,
+    'delete_promotion': 6,
+    'admin_products': 6,
+    'add_product': 8,
+    'delete_product': 8,
+    'admin_coupons': 6,
+    'add_coupon': 6,
+    'delete_coupon': 6,
+    'logout': 4,
+}
+
+# Budget for URL names without an entry (e.g. the Django admin)
+DEFAULT_BUDGET = 20
+
+# Number of repeated statements listed in a summary
+MAX_DUPLICATES = 5
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_budget(url_name):
+    return QUERY_BUDGETS.get(url_name, DEFAULT_BUDGET)
+
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_SAVEPOINT = re.compile(r'(?:RELEASE |ROLLBACK TO )?SAVEPOINT ', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalize a parametrized statement so repeated lookups compare equal."""
+    sql = _WHITESPACE.sub(' ', sql.strip())
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """
+    Record the queries run on the default connection.
+
+    Use as a context manager::
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.duration, recorder.duplicates()
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if _SAVEPOINT.match(sql):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def duplicates(self):
+        """Return `[(fingerprint, times), ...]` for statements run more than once."""
+        return [(sql, times) for sql, times in self.fingerprints.most_common(MAX_DUPLICATES) if times > 1]
+
+    def summary(self, url_name=None, budget=None):
+        return {
+            'view': url_name,
+            'queries': self.count,
+            'budget': budget,
+            'time_ms': round(self.duration * 1000, 2),
+            'duplicates': [{'sql': sql, 'times': times} for sql, times in self.duplicates()],
+        }
+
+
+def format_violation(summary):
+    message = '{view} ran {queries} queries (budget {budget}, {time_ms} ms)'.format(**summary)
+    for duplicate in summary['duplicates']:
+        message += '\n  {times}x {sql}'.format(**duplicate)
+    return message
+
+
+class QueryBudgetMiddleware:
+    """Check every request against its view's query budget."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.mode = getattr(settings, 'STORE_QUERY_BUDGET', 'warn')
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        budget = get_budget(url_name)
+        summary = recorder.summary(url_name, budget)
+
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time-Ms'] = str(summary['time_ms'])
+        response['X-Query-Budget'] = str(budget)
+        logger.info(json.dumps(summary))
+
+        if recorder.count > budget:
+            if self.mode == 'strict':
+                raise QueryBudgetExceeded(format_violation(summary))
+            logger.warning(format_violation(summary))
+        return response
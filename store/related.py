@@ -0,0 +1,108 @@
+"""
+Precomputed "related products" for the product detail page.
+
+A product's related products are the active products of the same
+category closest to it in price. They are computed for a whole category
+at once with a single query and stored per product in the cache as ready
+to render cards, so the detail view never queries for them on a warm
+cache. When a product or category changes, the signal handlers in
+`store.signals` queue a `related.refresh_category` job (one pending job
+per category, see `store.jobs`) instead of recomputing the category in
+the request. The job's cache writes and purges only reach the web
+processes through a shared cache backend (file or database); with the
+per-process local memory cache the category is refreshed in the request
+once the change commits.
+"""
+
+from django.db import transaction
+
+from store import cache as store_cache
+from store import page_cache
+from store.catalog import CARD_FIELDS, serialize_product_card
+from store.jobs import enqueue
+from store.models import Product
+
+
+RELATED_NAMESPACE = 'product:related'
+
+RELATED_LIMIT = 5
+
+# Seconds a queued refresh waits, so a burst of saves is handled once
+REFRESH_DELAY = 5
+
+
+def category_products(category_id):
+    """Return the active products of a category by price (None: no category)."""
+    return list(
+        Product.objects.filter(category_id=category_id, is_active=True)
+        .select_related('category')
+        .only(*CARD_FIELDS)
+        .order_by('price', 'id')
+    )
+
+
+def compute_related(products, limit=RELATED_LIMIT):
+    """Return `{product_id: [card, ...]}` for products sorted by price."""
+    cards = [serialize_product_card(product) for product in products]
+
+    related = {}
+    for index, product in enumerate(products):
+        # Products are sorted by price, so the closest ones are found by
+        # walking outwards from the product's own position
+        below, above = index - 1, index + 1
+        picked = []
+        while len(picked) < limit and (below >= 0 or above < len(products)):
+            if above >= len(products) or (
+                below >= 0 and product.price - products[below].price <= products[above].price - product.price
+            ):
+                picked.append(cards[below])
+                below -= 1
+            else:
+                picked.append(cards[above])
+                above += 1
+        related[product.id] = picked
+    return related
+
+
+def refresh_category(category_id):
+    """
+    Recompute the related products of a whole category; store and purge
+    the detail pages of only the products whose cards changed. Returns
+    how many changed.
+    """
+    products = category_products(category_id)
+    slugs = {product.id: product.slug for product in products}
+    changed = []
+    for product_id, cards in compute_related(products).items():
+        if store_cache.get(RELATED_NAMESPACE, product_id) != cards:
+            store_cache.set(RELATED_NAMESPACE, product_id, value=cards)
+            changed.append(product_id)
+
+    # Cached detail pages of these products render the old cards
+    if changed:
+        page_cache.purge_tags(*(page_cache.product_tag(slugs[product_id]) for product_id in changed))
+    return len(changed)
+
+
+def schedule_refresh(category_id):
+    """
+    Queue a background refresh of a category, unless one is already
+    pending; without a shared cache, refresh it here after the commit.
+    """
+    if store_cache.is_shared():
+        enqueue('related.refresh_category', delay=REFRESH_DELAY, unique=True, category_id=category_id)
+    else:
+        transaction.on_commit(lambda: refresh_category(category_id))
+
+
+def get_related_products(product):
+    """Return the related product cards of a product, computing them on a miss."""
+    return store_cache.get_or_set(
+        RELATED_NAMESPACE, product.id,
+        producer=lambda: compute_related(category_products(product.category_id)).get(product.id, []),
+    )
+
+
+def invalidate_all_related():
+    """Drop every precomputed list, e.g. after a category is deleted."""
+    store_cache.bump(RELATED_NAMESPACE)
@@ -0,0 +1,256 @@
+"""
+Product search index for the storefront.
+
+Search text (name, brand, category name and flattened specifications) is
+folded to plain ASCII lower case, so "dien thoai" matches "điện thoại",
+and stored in an SQLite FTS5 table keyed by product id. Databases without
+FTS5 fall back to a LIKE scan with the same interface.
+"""
+
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'store_product_search'
+
+# bm25() column weights: name, brand, category, specs
+FTS_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def fold_text(text):
+    """
+    Lower-case text and strip Vietnamese diacritics.
+
+    "Điện Thoại" -> "dien thoai"
+    """
+    if not text:
+        return ''
+    text = str(text).replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.lower()
+
+
+def flatten_specifications(specifications):
+    """Flatten a specifications JSON value into a single line of text."""
+    if isinstance(specifications, dict):
+        parts = []
+        for key, value in specifications.items():
+            parts.append(str(key))
+            parts.append(flatten_specifications(value))
+        return ' '.join(part for part in parts if part)
+    if isinstance(specifications, (list, tuple)):
+        return ' '.join(flatten_specifications(value) for value in specifications)
+    if specifications is None:
+        return ''
+    return str(specifications)
+
+
+def tokenize(query):
+    """Split a search query into folded tokens."""
+    return TOKEN_RE.findall(fold_text(query))
+
+
+def product_document(product, category_name=None):
+    """Return the folded (name, brand, category, specs) columns for a product."""
+    if category_name is None:
+        category_name = product.category.name if product.category_id else ''
+    return (
+        fold_text(product.name),
+        fold_text(product.brand),
+        fold_text(category_name),
+        fold_text(flatten_specifications(product.specifications)),
+    )
+
+
+class LikeSearchBackend:
+    """
+    Fallback backend using `icontains` lookups.
+
+    Used when the database has no FTS5 support. Index maintenance is a
+    no-op because the product table itself is scanned.
+    """
+
+    def index_products(self, product_ids):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def filter_queryset(self, products, query):
+        for token in query.split():
+            products = products.filter(
+                Q(name__icontains=token) |
+                Q(brand__icontains=token) |
+                Q(category__name__icontains=token)
+            )
+        return products
+
+    def rank_queryset(self, products, query):
+        """No relevance ranking: every match gets the same `search_rank`."""
+        return products.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def search(self, query, limit=50):
+        from store.models import Product
+
+        if not query.strip():
+            return []
+        products = Product.objects.filter(is_active=True)
+        products = self.filter_queryset(products, query)
+        return list(products.values_list('id', flat=True)[:limit])
+
+
+class FTSSearchBackend:
+    """
+    SQLite FTS5 backend.
+
+    One row per product in `store_product_search` with `rowid` equal to the
+    product id. Queries use prefix matching on every token and are ranked
+    with bm25().
+    """
+
+    def match_expression(self, query):
+        """Build an FTS5 MATCH expression: every token as a prefix."""
+        tokens = tokenize(query)
+        return ' AND '.join(f'"{token}"*' for token in tokens)
+
+    def index_products(self, product_ids):
+        """(Re)index the given products; inactive or missing ones are removed."""
+        from store.models import Product
+
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        products = Product.objects.filter(id__in=product_ids).select_related('category').only(
+            'id', 'name', 'brand', 'specifications', 'is_active', 'category__name'
+        )
+        rows = [
+            (product.id,) + product_document(product)
+            for product in products
+            if product.is_active
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._delete(cursor, product_ids)
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, brand, category, specs) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            self._delete(cursor, product_ids)
+
+    def _delete(self, cursor, product_ids):
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(product_id,) for product_id in product_ids],
+        )
+
+    def rebuild(self):
+        """Rebuild the whole index from the product table."""
+        from store.models import Product
+
+        rows = []
+        products = Product.objects.filter(is_active=True).select_related('category').only(
+            'id', 'name', 'brand', 'specifications', 'category__name'
+        )
+        for product in products.iterator(chunk_size=2000):
+            rows.append((product.id,) + product_document(product))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, brand, category, specs) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+        return len(rows)
+
+    def filter_queryset(self, products, query):
+        """
+        Restrict a product queryset to rows matching the query.
+
+        A query without any searchable term (only punctuation) matches
+        nothing.
+        """
+        expression = self.match_expression(query)
+        if not expression:
+            return products.none()
+        return products.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (expression,),
+        ))
+
+    def rank_queryset(self, products, query):
+        """
+        Annotate `search_rank` (bm25, lower is better) on products already
+        restricted by `filter_queryset`.
+        """
+        expression = self.match_expression(query)
+        if not expression:
+            return products.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        return products.annotate(search_rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{products.model._meta.db_table}"."id"',
+            (expression,),
+            output_field=FloatField(),
+        ))
+
+    def search(self, query, limit=50):
+        """Return product ids matching the query, best match first."""
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+                (expression, limit),
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backend = None
+
+
+def fts_available():
+    """Return True if the FTS5 search table exists in the database."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            (FTS_TABLE,),
+        )
+        return cursor.fetchone() is not None
+
+
+def get_search_backend():
+    """Return the search backend for the default database."""
+    global _backend
+    if _backend is None:
+        _backend = FTSSearchBackend() if fts_available() else LikeSearchBackend()
+    return _backend
+
+
+def reset_search_backend():
+    """Forget the cached backend (e.g. after migrations create the table)."""
+    global _backend
+    _backend = None
+
+
+def search_products(query, limit=50):
+    """Return ranked product ids for a search query."""
+    return get_search_backend().search(query, limit=limit)
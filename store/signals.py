@@ -0,0 +1,342 @@
+"""
+Model signal handlers for the store app.
+
+Connected in `StoreConfig.ready()`.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+from django.utils import timezone
+
+from store.models import Category, Coupon, Order, Product, SpecialPromotion
+from store import search
+from store.suggest import suggest_index
+from store.filter_index import filter_index
+from store import page_cache
+from store import payloads
+from store import related
+from store import sync
+from store import cart
+from store import coupons
+from store.coupon_index import coupon_index
+
+
+# ==================== SEARCH INDEX ====================
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Reindex a product after it is saved."""
+    if raw:
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: search.get_search_backend().index_products([product_id]))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Drop a deleted product from the search index."""
+    product_id = instance.pk
+    transaction.on_commit(lambda: search.get_search_backend().remove_products([product_id]))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, raw=False, **kwargs):
+    """Reindex every product of a category (its name is part of the document)."""
+    if raw:
+        return
+    product_ids = list(instance.products.values_list('id', flat=True))
+    transaction.on_commit(lambda: search.get_search_backend().index_products(product_ids))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_products(sender, instance, **kwargs):
+    """Remember the products of a category before SET_NULL detaches them."""
+    instance._search_product_ids = list(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_orphaned_products(sender, instance, **kwargs):
+    """Reindex products that lost their category."""
+    product_ids = getattr(instance, '_search_product_ids', [])
+    transaction.on_commit(lambda: search.get_search_backend().index_products(product_ids))
+
+
+# ==================== SUGGEST INDEX ====================
+
+@receiver(post_save, sender=Product)
+def refresh_product_suggestions(sender, instance, raw=False, **kwargs):
+    """Replace a product's autocomplete entries after it is saved."""
+    if raw:
+        return
+    transaction.on_commit(lambda: suggest_index.update_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestions(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove_product(product_id))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_suggestions(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: suggest_index.update_category(instance))
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    category_id = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove_category(category_id))
+
+
+# ==================== FILTER INDEX ====================
+
+@receiver(post_save, sender=Product)
+def refresh_product_filters(sender, instance, raw=False, **kwargs):
+    """Replace a product's filter postings after it is saved."""
+    if raw:
+        return
+    transaction.on_commit(lambda: filter_index.update_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_filters(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: filter_index.remove_product(product_id))
+
+
+# ==================== PAGE CACHE ====================
+
+@receiver(pre_save, sender=Product)
+def remember_product_listing(sender, instance, raw=False, **kwargs):
+    """Remember the slug, brand and category a product had before this save."""
+    if raw or not instance.pk:
+        instance._page_cache_previous = None
+        return
+    instance._page_cache_previous = Product.objects.filter(pk=instance.pk).values(
+        'slug', 'brand', 'category_id'
+    ).first()
+
+
+def product_page_tags(instance):
+    """Return the page cache tags a product appears under."""
+    tags = {'listing:all', page_cache.product_tag(instance.slug), page_cache.brand_tag(instance.brand)}
+    previous = getattr(instance, '_page_cache_previous', None)
+    if previous:
+        tags.add(page_cache.product_tag(previous['slug']))
+        tags.add(page_cache.brand_tag(previous['brand']))
+    return tags
+
+
+@receiver(post_save, sender=Product)
+def purge_product_pages(sender, instance, raw=False, **kwargs):
+    """Purge the product's detail page and every listing it can appear on."""
+    if raw:
+        return
+    tags = product_page_tags(instance)
+    if instance.special_promotions.exists():
+        tags.add('promotions')
+    transaction.on_commit(lambda: page_cache.purge_tags(*tags))
+
+
+@receiver(post_delete, sender=Product)
+def purge_deleted_product_pages(sender, instance, **kwargs):
+    # Its promotions are cascade-deleted and purge 'promotions' themselves
+    tags = product_page_tags(instance)
+    transaction.on_commit(lambda: page_cache.purge_tags(*tags))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_pages(sender, instance, raw=False, **kwargs):
+    """Category names show in the strip and match search queries."""
+    if raw:
+        return
+    transaction.on_commit(lambda: page_cache.purge_tags('categories', 'listing:all'))
+
+
+@receiver(post_save, sender=SpecialPromotion)
+@receiver(post_delete, sender=SpecialPromotion)
+def purge_promotion_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: page_cache.purge_tags('promotions'))
+
+
+# ==================== QUICK-VIEW PAYLOADS ====================
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_product_payload(sender, instance, raw=False, **kwargs):
+    """Rebuild the quick-view payload (a deleted product caches a 404)."""
+    if raw:
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: payloads.refresh_product_payload(product_id))
+
+
+@receiver(post_save, sender=SpecialPromotion)
+@receiver(post_delete, sender=SpecialPromotion)
+def refresh_promotion_payload(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    product_id = instance.product_id
+    transaction.on_commit(lambda: payloads.refresh_product_payload(product_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_payloads(sender, instance, raw=False, **kwargs):
+    """Payloads embed the category name."""
+    if raw:
+        return
+    transaction.on_commit(payloads.invalidate_all_payloads)
+
+
+# ==================== RELATED PRODUCTS ====================
+
+# Refreshed in the background when the cache is shared: the job rows are
+# committed with the change. Otherwise refreshed here after the commit.
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_related_products(sender, instance, raw=False, **kwargs):
+    """Queue a refresh of the related products of the product's old and new category."""
+    if raw:
+        return
+    category_ids = {instance.category_id}
+    previous = getattr(instance, '_page_cache_previous', None)
+    if previous:
+        category_ids.add(previous['category_id'])
+    for category_id in category_ids:
+        related.schedule_refresh(category_id)
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_related_products(sender, instance, raw=False, **kwargs):
+    """Related product cards embed the category name."""
+    if raw:
+        return
+    related.schedule_refresh(instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_related_products(sender, instance, **kwargs):
+    """Its products lost their category and now relate to other uncategorized ones."""
+    transaction.on_commit(related.invalidate_all_related)
+    related.schedule_refresh(None)
+
+
+# ==================== SYNC CHANGE LOG ====================
+# Written in the same transaction as the change, so the log never
+# mentions a change that was rolled back.
+
+@receiver(post_save, sender=Product)
+def log_product_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync.record_change('product', instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def log_product_delete(sender, instance, **kwargs):
+    sync.record_change('product', instance.pk, 'delete')
+
+
+@receiver(post_save, sender=Category)
+def log_category_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync.record_change('category', instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def log_category_delete(sender, instance, **kwargs):
+    sync.record_change('category', instance.pk, 'delete')
+    # SET_NULL detached its products without saving them
+    sync.record_changes('product', getattr(instance, '_search_product_ids', []))
+
+
+@receiver(post_save, sender=SpecialPromotion)
+def log_promotion_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync.record_change('promotion', instance.pk)
+
+
+@receiver(post_delete, sender=SpecialPromotion)
+def log_promotion_delete(sender, instance, **kwargs):
+    sync.record_change('promotion', instance.pk, 'delete')
+
+
+# ==================== CATALOG EXPORT ====================
+# Incremental exports select products by `updated_at`, so changes that
+# alter a product's exported row without saving the product touch it.
+
+def touch_products(product_ids):
+    Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=SpecialPromotion)
+@receiver(post_delete, sender=SpecialPromotion)
+def touch_promoted_product(sender, instance, raw=False, **kwargs):
+    """Covers promotions that were deactivated or deleted, too."""
+    if raw:
+        return
+    touch_products([instance.product_id])
+
+
+@receiver(post_delete, sender=Category)
+def touch_uncategorized_products(sender, instance, **kwargs):
+    touch_products(getattr(instance, '_search_product_ids', []))
+
+
+# ==================== CART ====================
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Carry the anonymous session cart over to the account."""
+    if request is not None and hasattr(request, 'session'):
+        cart.merge_session_cart(request, user)
+
+
+# ==================== COUPON INDEX ====================
+
+@receiver(post_save, sender=Coupon)
+def refresh_coupon_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: coupon_index.update_coupon(instance))
+
+
+@receiver(post_delete, sender=Coupon)
+def remove_coupon_from_index(sender, instance, **kwargs):
+    coupon_id = instance.pk
+    transaction.on_commit(lambda: coupon_index.remove_coupon(coupon_id))
+
+
+# ==================== COUPON REDEMPTIONS ====================
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, raw=False, **kwargs):
+    instance._previous_status = None
+    if not raw and instance.pk:
+        instance._previous_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def release_cancelled_order_coupon(sender, instance, raw=False, **kwargs):
+    """A cancelled order gives its coupon use back."""
+    if raw:
+        return
+    if instance.status == 'rejected' and getattr(instance, '_previous_status', None) not in (None, 'rejected'):
+        coupons.cancel_order_coupon(instance)
+
+
+@receiver(post_migrate)
+def reset_search_backend(sender, **kwargs):
+    """Re-detect FTS5 support once migrations have run."""
+    search.reset_search_backend()
@@ -0,0 +1,238 @@
+"""
+In-memory prefix index for search-as-you-type suggestions.
+
+The index is a sorted array of folded keys searched with `bisect`, so a
+lookup never touches the database. Every word start of a product name is
+indexed ("iphone 15 pro max", "15 pro max", "pro max", "max") so typing
+"pro" finds "iPhone 15 Pro". A background thread, started with the WSGI
+application, builds it at startup and rebuilds it every MAX_INDEX_AGE
+seconds, swapping the new arrays in when they are ready; requests never
+wait for a build. The Product/Category signal handlers in `store.signals`
+keep it current in between.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db import connection
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from store.search import fold_text, tokenize
+
+
+# Rebuild from the database after this many seconds, so changes saved in
+# another worker process are eventually picked up.
+MAX_INDEX_AGE = 300
+
+DEFAULT_LIMIT = 8
+
+logger = logging.getLogger(__name__)
+
+
+class SuggestIndex:
+    """
+    Sorted-array prefix index over product names, brands and categories.
+
+    Entries are `(key, kind, ref)` tuples; `kind` is 'product', 'brand' or
+    'category' and `ref` identifies the target in `self.targets`.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = []
+        self.targets = {}
+        self.keys_by_target = {}
+        self.brand_counts = {}
+        self.product_brands = {}
+        self.built_at = None
+        # Changes seen while a build is loading, replayed onto the new arrays
+        self.pending = None
+        self.refresher = None
+
+    # ---------- building ----------
+
+    def build(self):
+        """
+        Load every active product and category from the database into a new
+        index, then swap it in.
+
+        Lookups keep using the current arrays while the database is read.
+        """
+        from store.models import Category, Product
+
+        with self.lock:
+            self.pending = []
+        fresh = SuggestIndex()
+        try:
+            products = Product.objects.filter(is_active=True).only('id', 'name', 'slug', 'brand')
+            for product in products.iterator(chunk_size=2000):
+                fresh._add_product(product)
+            for category in Category.objects.filter(is_active=True).only('id', 'name'):
+                fresh._add_category(category)
+            fresh.entries.sort()
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+
+        with self.lock:
+            for change in self.pending:
+                change(fresh)
+            self.pending = None
+            self.entries = fresh.entries
+            self.targets = fresh.targets
+            self.keys_by_target = fresh.keys_by_target
+            self.brand_counts = fresh.brand_counts
+            self.product_brands = fresh.product_brands
+            self.built_at = time.monotonic()
+
+    def start(self, interval=MAX_INDEX_AGE):
+        """
+        Build the index on a background thread and rebuild it every
+        `interval` seconds, so changes saved in another worker process are
+        eventually picked up. Does nothing if the thread already runs.
+        """
+        with self.lock:
+            if self.refresher is not None:
+                return
+            self.refresher = threading.Thread(
+                target=self._refresh_forever, args=(interval,), name='suggest-index', daemon=True,
+            )
+        self.refresher.start()
+
+    def _refresh_forever(self, interval):
+        while True:
+            try:
+                self.build()
+            except Exception:
+                logger.exception('Could not build the suggestion index')
+            finally:
+                connection.close()
+            time.sleep(interval)
+
+    def _word_keys(self, text):
+        """Return the folded text starting at every word boundary."""
+        words = tokenize(text)
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _insert(self, target, keys, payload, sort=False):
+        kind, ref = target
+        self.targets[target] = payload
+        self.keys_by_target[target] = keys
+        for key in keys:
+            if sort:
+                insort(self.entries, (key, kind, ref))
+            else:
+                self.entries.append((key, kind, ref))
+
+    def _remove(self, target):
+        kind, ref = target
+        for key in self.keys_by_target.pop(target, []):
+            entry = (key, kind, ref)
+            index = bisect_left(self.entries, entry)
+            if index < len(self.entries) and self.entries[index] == entry:
+                del self.entries[index]
+        self.targets.pop(target, None)
+
+    def _add_product(self, product, sort=False):
+        target = ('product', product.id)
+        self._insert(target, self._word_keys(product.name), {
+            'type': 'product',
+            'label': product.name,
+            'url': reverse('product_detail', kwargs={'slug': product.slug}),
+        }, sort=sort)
+
+        brand = (product.brand or '').strip()
+        if brand:
+            self.product_brands[product.id] = brand
+            brand_key = fold_text(brand)
+            self.brand_counts[brand_key] = self.brand_counts.get(brand_key, 0) + 1
+            if self.brand_counts[brand_key] == 1:
+                self._insert(('brand', brand_key), [brand_key], {
+                    'type': 'brand',
+                    'label': brand,
+                    'url': reverse('home') + '?' + urlencode({'brand': brand}),
+                }, sort=sort)
+
+    def _drop_product(self, product_id):
+        self._remove(('product', product_id))
+        brand = self.product_brands.pop(product_id, None)
+        if brand:
+            brand_key = fold_text(brand)
+            self.brand_counts[brand_key] -= 1
+            if self.brand_counts[brand_key] <= 0:
+                del self.brand_counts[brand_key]
+                self._remove(('brand', brand_key))
+
+    def _add_category(self, category, sort=False):
+        self._insert(('category', category.id), self._word_keys(category.name), {
+            'type': 'category',
+            'label': category.name,
+            'url': reverse('home') + '?' + urlencode({'q': category.name}),
+        }, sort=sort)
+
+    # ---------- incremental updates ----------
+
+    def _apply(self, change):
+        """Apply `change(index)` now and to a build in progress, if any."""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(change)
+            if self.built_at is not None:
+                change(self)
+
+    def update_product(self, product):
+        """Replace a product's entries after it was saved."""
+        def change(index):
+            index._drop_product(product.id)
+            if product.is_active:
+                index._add_product(product, sort=True)
+        self._apply(change)
+
+    def remove_product(self, product_id):
+        self._apply(lambda index: index._drop_product(product_id))
+
+    def update_category(self, category):
+        def change(index):
+            index._remove(('category', category.id))
+            if category.is_active:
+                index._add_category(category, sort=True)
+        self._apply(change)
+
+    def remove_category(self, category_id):
+        self._apply(lambda index: index._remove(('category', category_id)))
+
+    # ---------- lookup ----------
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """
+        Return suggestion dicts whose indexed text starts with the query.
+
+        Brands and categories are listed before products. Until the first
+        build has finished there are no suggestions; the index is never
+        built inside a request.
+        """
+        prefix = ' '.join(tokenize(query))
+        if not prefix:
+            return []
+
+        groups = {'brand': [], 'category': [], 'product': []}
+        seen = set()
+        with self.lock:
+            index = bisect_left(self.entries, (prefix,))
+            while index < len(self.entries) and len(seen) < limit * 3:
+                key, kind, ref = self.entries[index]
+                if not key.startswith(prefix):
+                    break
+                if (kind, ref) not in seen:
+                    seen.add((kind, ref))
+                    groups[kind].append(self.targets[(kind, ref)])
+                index += 1
+
+        return (groups['brand'] + groups['category'] + groups['product'])[:limit]
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,129 @@
+"""
+Incremental catalog sync.
+
+Every save or delete of a Product, Category or SpecialPromotion appends
+a row to `CatalogChange` (from the signal handlers in `store.signals`,
+inside the same transaction as the change itself). Its auto-increment id
+is the sync token: a client stores the last token it processed and asks
+for the changes after it, receiving the current state of each changed
+object (upserts) and the ids of deleted ones (tombstones).
+
+Within a batch, several changes to the same object collapse into one
+entry, so a client only moves the net delta. Token 0 replays the whole
+catalog, which migration 0013 logged once.
+"""
+
+from store.catalog import serialize_product_card
+from store.models import CatalogChange, Category, Product, SpecialPromotion
+
+
+DEFAULT_BATCH = 500
+MAX_BATCH = 2000
+
+ENTITIES = ('category', 'product', 'promotion')
+
+
+# ==================== RECORDING ====================
+
+def record_change(entity, object_id, action='upsert'):
+    CatalogChange.objects.create(entity=entity, object_id=object_id, action=action)
+
+
+def record_changes(entity, object_ids, action='upsert'):
+    """Log changes to many objects at once, e.g. after a bulk load."""
+    CatalogChange.objects.bulk_create(
+        [CatalogChange(entity=entity, object_id=object_id, action=action) for object_id in object_ids],
+        batch_size=2000,
+    )
+
+
+# ==================== SERIALIZING ====================
+
+def serialize_category(category):
+    return {
+        'id': category.id,
+        'name': category.name,
+        'slug': category.slug,
+        'is_active': category.is_active,
+        'sort_order': category.sort_order,
+    }
+
+
+def serialize_product(product):
+    data = serialize_product_card(product)
+    data['category_id'] = product.category_id
+    data['updated_at'] = product.updated_at
+    return data
+
+
+def serialize_promotion(promotion):
+    return {
+        'id': promotion.id,
+        'product_id': promotion.product_id,
+        'discount_percent': promotion.discount_percent,
+        'is_active': promotion.is_active,
+    }
+
+
+def load_objects(entity, ids):
+    """Return the current objects of an entity, or [] for none."""
+    if not ids:
+        return []
+    if entity == 'category':
+        return Category.objects.filter(id__in=ids)
+    if entity == 'product':
+        return Product.objects.filter(id__in=ids).select_related('category')
+    return SpecialPromotion.objects.filter(id__in=ids)
+
+
+SERIALIZERS = {
+    'category': serialize_category,
+    'product': serialize_product,
+    'promotion': serialize_promotion,
+}
+
+
+# ==================== READING ====================
+
+def get_changes(since=0, limit=DEFAULT_BATCH):
+    """
+    Return the net changes after token `since`, at most `limit` log rows.
+
+    Inactive products and categories are sent as tombstones: clients
+    mirroring the storefront drop them either way.
+    """
+    changes = list(
+        CatalogChange.objects.filter(id__gt=since).order_by('id').values_list('id', 'entity', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # The last change of each object wins
+    latest = {}
+    for _, entity, object_id, action in changes:
+        latest[(entity, object_id)] = action
+
+    upserts = {entity: [] for entity in ENTITIES}
+    deletes = {entity: [] for entity in ENTITIES}
+    for entity in ENTITIES:
+        ids = [object_id for (name, object_id), action in latest.items() if name == entity and action == 'upsert']
+        found = set()
+        for obj in load_objects(entity, ids):
+            found.add(obj.id)
+            if entity != 'promotion' and not obj.is_active:
+                deletes[entity].append(obj.id)
+            else:
+                upserts[entity].append(SERIALIZERS[entity](obj))
+        # Already deleted; its own tombstone may only come in a later batch
+        deletes[entity].extend(object_id for object_id in ids if object_id not in found)
+        deletes[entity].extend(
+            object_id for (name, object_id), action in latest.items() if name == entity and action == 'delete'
+        )
+        deletes[entity].sort()
+
+    return {
+        'token': changes[-1][0] if changes else since,
+        'has_more': has_more,
+        'upserts': upserts,
+        'deletes': deletes,
+    }
@@ -0,0 +1,55 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from store.images import build_srcset
+
+register = template.Library()
+
+PLACEHOLDER = 'https://placehold.co/300x400/e5e7eb/6b7280?text=No+Image'
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+@register.filter
+def srcset(product, image_format='webp'):
+    """
+    Build a srcset from a product's image derivatives (see store.images).
+
+    Usage in template: <img srcset="{{ product|srcset:'webp' }}" ...>
+    """
+    return build_srcset(getattr(product, 'image_variants', None), image_format)
+
+
+@register.simple_tag
+def product_picture(product, sizes='200px', css_class=''):
+    """
+    Render a <picture> with AVIF/WebP sources and a JPEG fallback, lazy
+    loaded over the blurred LQIP placeholder.
+
+    Usage in template: {% product_picture product sizes="(max-width: 640px) 50vw, 200px" %}
+    Falls back to the original upload for products without derivatives.
+    """
+    variants = getattr(product, 'image_variants', None) or {}
+    if not variants:
+        src = product.image.url if product.image else PLACEHOLDER
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async" onerror="this.src=\'{}\'">',
+            src, product.name, css_class, PLACEHOLDER,
+        )
+
+    fallback = variants.get('jpeg') or next(iter(variants.values()))
+    smallest = min(fallback, key=int)
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[image_format], srcset(product, image_format), sizes)
+         for image_format in ('avif', 'webp') if image_format in variants),
+    )
+    style = format_html(
+        'background-image: url({}); background-size: cover;', product.image_lqip
+    ) if product.image_lqip else ''
+    return format_html(
+        '<picture>{}<img src="{}{}" srcset="{}" sizes="{}" alt="{}" class="{}" style="{}" '
+        'loading="lazy" decoding="async" onerror="this.src=\'{}\'"></picture>',
+        sources, settings.MEDIA_URL, fallback[smallest], srcset(product, 'jpeg'), sizes,
+        product.name, css_class, style, PLACEHOLDER,
+    )
@@ -0,0 +1,24 @@
+"""
+Test helpers for the store app.
+"""
+
+from contextlib import contextmanager
+
+from store.query_budget import QueryRecorder, format_violation, get_budget
+
+
+@contextmanager
+def assert_query_budget(url_name, budget=None):
+    """
+    Fail if the block runs more queries than the view's declared budget.
+
+        with assert_query_budget('product_detail'):
+            client.get(url)
+
+    `budget` overrides the budget from `QUERY_BUDGETS`.
+    """
+    budget = get_budget(url_name) if budget is None else budget
+    with QueryRecorder() as recorder:
+        yield recorder
+    if recorder.count > budget:
+        raise AssertionError(format_violation(recorder.summary(url_name, budget)))
@@ -0,0 +1,911 @@
+"""
+Tests for the store app.
+"""
+
+import base64
+import json
+import logging
+import signal
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from store import cache as store_cache, page_cache, related
+from store.export import export_queryset
+from store.filter_index import INDEX_VERSION_NAMESPACE, filter_index
+from store.jobs import RETRY_BASE, enqueue, task
+from store.loader import load_catalog
+from store.cart import Cart
+from store.catalog import CatalogQuery
+from store.checkout import CheckoutError, OutOfStock, add_availability, place_order, release_expired, reserve_stock
+from store.coupon_index import coupon_index
+from store.coupons import CouponError, cancel_redemption, redeem_coupon
+from store.models import (
+    Address, CartItem, Category, Coupon, CouponRedemption, Job, Order, OrderItem, Product, SpecialPromotion,
+    StockReservation,
+)
+from store.query_budget import QUERY_BUDGETS
+from store.related import RELATED_LIMIT
+from store.search import get_search_backend
+from store.suggest import SuggestIndex, suggest_index
+from store.testing import assert_query_budget
+
+
+def run_concurrently(func, calls):
+    """
+    Run `func(*args)` once for each args tuple in its own thread, all
+    released at once; return the results (or raised exceptions) in order.
+    """
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def worker(index, args):
+        barrier.wait()
+        try:
+            results[index] = func(*args)
+        except Exception as e:
+            results[index] = e
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index, args)) for index, args in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class StoreTestCase(TestCase):
+    """Start every test from an empty cache and an unbuilt filter index."""
+
+    def setUp(self):
+        cache.clear()
+        filter_index.built_at = None
+
+    @classmethod
+    def create_product(cls, name, brand, price=10000000, **fields):
+        fields.setdefault('category', cls.category)
+        fields.setdefault('stock', 10)
+        return Product.objects.create(name=name, brand=brand, price=price, **fields)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Điện thoại')
+        cls.apple = cls.create_product('iPhone 15', 'Apple')
+        cls.samsung = cls.create_product('Galaxy S24', 'Samsung')
+
+
+# ==================== CURSOR PAGINATION ====================
+
+class CursorPaginationTests(StoreTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(20):
+            cls.create_product(f'Redmi {index}', 'Xiaomi', price=3000000 + index % 4 * 500000, is_featured=index % 3 == 0)
+
+    def page_ids(self, **params):
+        ids = []
+        for page in range(1, 4):
+            response = self.client.get('/api/products/', {'page': page, **params})
+            ids += [product['id'] for product in response.json()['products']]
+        return ids
+
+    def cursor_ids(self, **params):
+        ids, cursor = [], ''
+        while cursor is not None:
+            data = self.client.get('/api/products/', {'cursor': cursor, **params}).json()
+            ids += [product['id'] for product in data['products']]
+            cursor = data['next_cursor']
+        return ids
+
+    def test_cursor_pages_match_numbered_pages(self):
+        for sort in ('default', 'asc', 'desc'):
+            with self.subTest(sort=sort):
+                ids = self.cursor_ids(sort=sort)
+                self.assertEqual(len(ids), Product.objects.count())
+                self.assertEqual(ids, self.page_ids(sort=sort))
+
+    def test_numbered_page_continues_in_cursor_mode(self):
+        first = self.client.get('/api/products/', {'page': 1}).json()
+        second = self.client.get('/api/products/', {'cursor': first['next_cursor']}).json()
+        expected = self.client.get('/api/products/', {'page': 2}).json()
+        self.assertEqual(second['products'], expected['products'])
+
+    def test_rejects_crafted_cursors(self):
+        crafted = (['asc', ['NaN'], 1], ['asc', ['Infinity'], 1], ['asc', [1], 1],
+                   ['default', ['2026-01-01T00:00:00', 'yes'], 1], ['asc', ['100'], '1'], 'garbage')
+        for value in crafted:
+            cursor = base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+            with self.subTest(cursor=value):
+                response = self.client.get('/api/products/', {'cursor': cursor, 'sort': value[0]})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+
+# ==================== SEARCH ====================
+
+class SearchTests(StoreTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.watch = cls.create_product('Đồng hồ Galaxy Watch 6', 'Samsung')
+        # Created last, so it would be listed first without ranking
+        cls.case = cls.create_product('Ốp lưng silicon', 'Samsung', specifications={'Tương thích': 'Galaxy S24'})
+
+    def setUp(self):
+        super().setUp()
+        get_search_backend().rebuild()
+
+    def search(self, query, **params):
+        response = self.client.get('/api/products/', {'q': query, **params})
+        return [product['id'] for product in response.json()['products']]
+
+    def test_folds_diacritics(self):
+        self.assertEqual(self.search('dong ho'), [self.watch.id])
+        self.assertEqual(self.search('ĐỒNG HỒ'), [self.watch.id])
+        self.assertEqual(self.search('op lung'), [self.case.id])
+
+    def test_matches_prefix_of_last_word(self):
+        self.assertEqual(self.search('galaxy wat'), [self.watch.id])
+        self.assertEqual(self.search('iph'), [self.apple.id])
+
+    def test_ranks_name_matches_first(self):
+        ids = self.search('galaxy')
+        self.assertEqual(set(ids), {self.samsung.id, self.watch.id, self.case.id})
+        self.assertEqual(ids[-1], self.case.id)
+        # An explicit sort still wins over relevance
+        self.assertEqual(self.search('galaxy', sort='asc'), sorted(ids))
+
+    def test_ranked_results_page_by_cursor(self):
+        first = self.client.get('/api/products/', {'q': 'galaxy', 'cursor': ''}).json()
+        self.assertEqual([product['id'] for product in first['products']], self.search('galaxy'))
+
+        ids, cursor = [], ''
+        with mock.patch.object(CatalogQuery, 'per_page', 1):
+            while cursor is not None:
+                data = self.client.get('/api/products/', {'q': 'galaxy', 'cursor': cursor}).json()
+                ids += [product['id'] for product in data['products']]
+                cursor = data['next_cursor']
+        self.assertEqual(ids, self.search('galaxy'))
+
+    def test_query_without_terms_matches_nothing(self):
+        for query in ('!!!', '"', '*'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+
+# ==================== SEARCH SUGGESTIONS ====================
+
+class SuggestTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        suggest_index.build()
+
+    def labels(self, query):
+        return [suggestion['label'] for suggestion in suggest_index.suggest(query)]
+
+    def test_lookup_does_not_query(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api_search_suggest'), {'q': 'iph'})
+        self.assertEqual([suggestion['label'] for suggestion in response.json()['suggestions']], ['iPhone 15'])
+
+    def test_unbuilt_index_answers_without_building(self):
+        index = SuggestIndex()
+        with self.assertNumQueries(0):
+            self.assertEqual(index.suggest('iph'), [])
+        self.assertIsNone(index.built_at)
+
+    def test_rebuild_swaps_in_and_keeps_changes_made_meanwhile(self):
+        add_category = SuggestIndex._add_category
+
+        def add_category_during_build(index, category, sort=False):
+            # Lookups are still answered from the current arrays...
+            self.assertIn('Galaxy S24', self.labels('galaxy'))
+            # ...and a change arriving now is not lost by the swap
+            suggest_index.remove_product(self.samsung.id)
+            add_category(index, category, sort)
+
+        with mock.patch.object(SuggestIndex, '_add_category', add_category_during_build):
+            suggest_index.build()
+        self.assertEqual(self.labels('galaxy'), [])
+        self.assertEqual(self.labels('iphone'), ['iPhone 15'])
+
+    def test_start_builds_in_the_background(self):
+        index = SuggestIndex()
+        index.start(interval=3600)
+        index.start(interval=3600)
+        deadline = time.monotonic() + 5
+        while index.built_at is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNotNone(index.built_at)
+        self.assertTrue(index.refresher.daemon)
+
+
+# ==================== FILTER INDEX ====================
+
+class FilterIndexTests(StoreTestCase):
+    """Orders only make other workers rebuild when a product sells out."""
+
+    def order(self, product, quantity):
+        user = User.objects.create_user(f'buyer{quantity}')
+        CartItem.objects.create(user=user, product=product, quantity=quantity)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(Cart(SimpleNamespace(user=user, session={})))
+
+    def version(self):
+        return store_cache.get_version(INDEX_VERSION_NAMESPACE)
+
+    def in_stock_ids(self):
+        response = self.client.get('/api/products/', {'in_stock': '1'})
+        return {product['id'] for product in response.json()['products']}
+
+    def test_order_that_leaves_stock_keeps_the_version(self):
+        self.assertIn(self.apple.id, self.in_stock_ids())
+        version = self.version()
+        self.order(self.apple, 3)
+        self.assertEqual(self.version(), version)
+
+    def test_sell_out_publishes_and_keeps_own_copy(self):
+        self.assertIn(self.apple.id, self.in_stock_ids())
+        version = self.version()
+        self.order(self.apple, 10)
+        self.assertEqual(self.version(), version + 1)
+        self.assertEqual(filter_index.version, version + 1)
+        # The page and its checkout holds, without rebuilding the index
+        with self.assertNumQueries(2):
+            self.assertNotIn(self.apple.id, self.in_stock_ids())
+
+
+# ==================== CONDITIONAL GET ====================
+
+class ListingETagTests(StoreTestCase):
+
+    def assert_etag_changes(self, url):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # A product of another brand changes the brand facet counts
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_product('Galaxy A55', 'Samsung')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_brand_filtered_home_revalidates_on_other_brand_change(self):
+        self.assert_etag_changes('/?brand=Apple')
+
+    def test_brand_filtered_api_revalidates_on_other_brand_change(self):
+        response = self.assert_etag_changes('/api/products/?brand=Apple')
+        counts = {facet['value']: facet['count'] for facet in response.json()['facets']['brand']}
+        self.assertEqual(counts['Samsung'], 2)
+
+
+# ==================== PRODUCT DETAIL ====================
+
+class ProductDetailQueryTests(StoreTestCase):
+    """The detail view runs a fixed number of queries, whatever the category size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(8):
+            cls.create_product(f'iPhone 14 {index}', 'Apple', price=9000000 + index * 100000)
+
+    def get_detail(self, product):
+        # Skip the anonymous page cache, which would answer without any query
+        page_cache.purge_tags(page_cache.product_tag(product.slug))
+        return self.client.get(reverse('product_detail', kwargs={'slug': product.slug}))
+
+    def test_cold_related_cache(self):
+        # Product, checkout holds and the category's products for the related cards
+        with self.assertNumQueries(3), assert_query_budget('product_detail'):
+            response = self.get_detail(self.apple)
+        self.assertEqual(len(response.context['related_products']), RELATED_LIMIT)
+
+    def test_warm_related_cache(self):
+        self.get_detail(self.apple)
+        with self.assertNumQueries(2), assert_query_budget('product_detail'):
+            response = self.get_detail(self.apple)
+        self.assertEqual(len(response.context['related_products']), RELATED_LIMIT)
+
+    def test_refresh_only_purges_changed_pages(self):
+        related.refresh_category(self.category.id)
+        self.assertEqual(related.refresh_category(self.category.id), 0)
+        self.samsung.price = 9350000
+        self.samsung.save()
+        self.assertGreater(related.refresh_category(self.category.id), 0)
+
+    def test_product_save_queues_one_refresh_per_category(self):
+        Job.objects.all().delete()
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            self.apple.stock = 3
+            self.apple.save()
+            self.samsung.stock = 3
+            self.samsung.save()
+        self.assertEqual(Job.objects.filter(task='related.refresh_category', status='pending').count(), 1)
+
+    def test_product_save_refreshes_inline_without_shared_cache(self):
+        self.assertEqual(related.get_related_products(self.apple)[0]['id'], self.samsung.id)
+        Job.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.samsung.price = 9350000
+            self.samsung.save()
+        self.assertFalse(Job.objects.exists())
+        cards = {card['id']: card for card in related.get_related_products(self.apple)}
+        self.assertEqual(cards[self.samsung.id]['price'], 9350000)
+
+
+# ==================== QUERY BUDGETS ====================
+
+@override_settings(
+    STORE_QUERY_BUDGET='strict',
+    MIDDLEWARE=['store.query_budget.QueryBudgetMiddleware'] + settings.MIDDLEWARE,
+)
+class QueryBudgetTests(StoreTestCase):
+    """Every store URL stays within its declared query budget."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('staff', password='secret', is_staff=True)
+        cls.address = Address.objects.create(
+            user=cls.user, full_name='Nguyễn Văn A', phone='0900000000', province='Hà Nội',
+            district='Ba Đình', ward='Điện Biên', address_detail='1 Hùng Vương', is_default=True,
+        )
+        CartItem.objects.create(user=cls.user, product=cls.apple, quantity=1)
+        cls.coupon = create_coupon('BUDGET')
+        cls.promotion = SpecialPromotion.objects.create(product=cls.samsung, discount_percent=10)
+        cls.job = Job.objects.create(task='cache.warm')
+
+    def url_kwargs(self):
+        return {
+            'product_detail': {'slug': self.apple.slug},
+            'set_default_address': {'address_id': self.address.id},
+            'delete_address': {'address_id': self.address.id},
+            'get_product_details': {'product_id': self.apple.id},
+            'api_job_status': {'job_id': self.job.id},
+            'delete_promotion': {'promotion_id': self.promotion.id},
+            'delete_product': {'product_id': self.samsung.id},
+            'delete_coupon': {'coupon_id': self.coupon.id},
+        }
+
+    def test_every_url_has_a_budget(self):
+        from store.urls import urlpatterns
+
+        self.assertEqual({pattern.name for pattern in urlpatterns} - set(QUERY_BUDGETS), set())
+
+    def test_every_url_within_budget(self):
+        self.client.login(username='staff', password='secret')
+        url_kwargs = self.url_kwargs()
+        # Logging out last keeps the session for the others
+        for url_name in sorted(QUERY_BUDGETS, key=lambda name: name == 'logout'):
+            with self.subTest(url_name=url_name):
+                self.client.get(reverse(url_name, kwargs=url_kwargs.get(url_name)))
+
+    def test_anonymous_pages_within_budget(self):
+        for url_name in ('home', 'product_detail', 'api_products', 'cart', 'api_cart'):
+            with self.subTest(url_name=url_name):
+                self.client.get(reverse(url_name, kwargs=self.url_kwargs().get(url_name)))
+
+    def test_cart_and_checkout_posts_within_budget(self):
+        self.client.login(username='staff', password='secret')
+        for _ in range(2):
+            self.assertTrue(self.client.post(reverse('cart_add'), {'product_id': self.samsung.id}).json()['success'])
+        key = next(line['key'] for line in self.client.get(reverse('api_cart')).json()['lines']
+                   if line['product_id'] == self.samsung.id)
+        self.client.post(reverse('cart_update'), {'key': key, 'quantity': 1})
+        self.client.post(reverse('checkout'), {'address_id': self.address.id, 'payment_method': 'cod'})
+        self.assertEqual(Order.objects.get(user=self.user).items.count(), 2)
+        self.client.post(reverse('cart_add'), {'product_id': self.samsung.id})
+        self.client.post(reverse('cart_remove'), {'key': key})
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+
+# ==================== CATALOG LOADER ====================
+
+class LoaderTests(StoreTestCase):
+
+    def load(self, *rows):
+        stats = load_catalog(enumerate(rows, start=2))
+        self.assertEqual(stats['errors'], [])
+        return stats
+
+    def test_price_only_row_recomputes_discount(self):
+        self.load({'name': 'Test Phone A', 'price': '1000000', 'original_price': '2000000'})
+        product = Product.objects.get(slug='test-phone-a')
+        self.assertEqual(product.discount_percent, 50)
+
+        self.load({'name': 'Test Phone A', 'price': '1500000'})
+        product.refresh_from_db()
+        self.assertEqual(product.price, 1500000)
+        self.assertEqual(product.original_price, 2000000)
+        self.assertEqual(product.discount_percent, 25)
+
+    def test_price_above_original_price_clears_discount(self):
+        self.load({'name': 'Test Phone B', 'price': '1000000', 'original_price': '2000000'})
+        self.load({'name': 'Test Phone B', 'price': '2500000'})
+        self.assertEqual(Product.objects.get(slug='test-phone-b').discount_percent, 0)
+
+
+# ==================== CATALOG EXPORT ====================
+
+class IncrementalExportTests(StoreTestCase):
+
+    def exported_ids(self, since):
+        return [product.id for product in export_queryset(since)]
+
+    def test_removed_promotion_re_exports_product(self):
+        promotion = SpecialPromotion.objects.create(product=self.apple, discount_percent=10)
+        since = timezone.now()
+        self.assertNotIn(self.apple.id, self.exported_ids(since))
+
+        promotion.is_active = False
+        promotion.save()
+        self.assertIn(self.apple.id, self.exported_ids(since))
+
+        since = timezone.now()
+        promotion.delete()
+        self.assertIn(self.apple.id, self.exported_ids(since))
+
+
+# ==================== CATALOG SYNC ====================
+
+class SyncTests(StoreTestCase):
+
+    def sync(self, since, **params):
+        response = self.client.get(reverse('api_sync'), {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def current_token(self):
+        return self.sync(0, limit=2000)['token']
+
+    def test_sends_net_changes_after_the_token(self):
+        token = self.current_token()
+        self.apple.price = 9990000
+        self.apple.save()
+        self.apple.price = 9890000
+        self.apple.save()
+
+        data = self.sync(token)
+        self.assertEqual([product['id'] for product in data['upserts']['product']], [self.apple.id])
+        self.assertEqual(data['upserts']['product'][0]['price'], 9890000)
+        self.assertEqual(data['deletes']['product'], [])
+        self.assertGreater(data['token'], token)
+        self.assertFalse(data['has_more'])
+
+        # Nothing new: the token stays put
+        again = self.sync(data['token'])
+        self.assertEqual(again['token'], data['token'])
+        self.assertEqual(again['upserts']['product'], [])
+
+    def test_deleted_and_deactivated_objects_are_tombstones(self):
+        token = self.current_token()
+        samsung_id = self.samsung.id
+        self.samsung.delete()
+        self.apple.is_active = False
+        self.apple.save()
+        promotion = SpecialPromotion.objects.create(product=self.create_product('Pixel 8', 'Google'), discount_percent=5)
+        promotion_id = promotion.id
+        promotion.delete()
+
+        data = self.sync(token)
+        self.assertEqual(data['deletes']['product'], sorted([samsung_id, self.apple.id]))
+        self.assertEqual(data['deletes']['promotion'], [promotion_id])
+        self.assertNotIn(self.apple.id, [product['id'] for product in data['upserts']['product']])
+
+    def test_batches_resume_from_the_returned_token(self):
+        token = self.current_token()
+        created = [self.create_product(f'Moto {index}', 'Motorola').id for index in range(5)]
+
+        seen = []
+        data = {'token': token, 'has_more': True}
+        while data['has_more']:
+            data = self.sync(data['token'], limit=2)
+            seen += [product['id'] for product in data['upserts']['product']]
+        self.assertEqual(sorted(seen), created)
+
+    def test_rejects_bad_parameters(self):
+        response = self.client.get(reverse('api_sync'), {'since': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+# ==================== BACKGROUND JOBS ====================
+
+FLAKY_CALLS = []
+
+
+@task('tests.flaky')
+def flaky_task(failures):
+    """Fail the first `failures` calls, then succeed."""
+    FLAKY_CALLS.append(len(FLAKY_CALLS) + 1)
+    if len(FLAKY_CALLS) <= failures:
+        raise RuntimeError(f'attempt {len(FLAKY_CALLS)} failed')
+    return {'attempts': len(FLAKY_CALLS)}
+
+
+class WorkerRetryTests(TransactionTestCase):
+    """run_worker retries failed jobs with exponential backoff."""
+
+    def setUp(self):
+        FLAKY_CALLS.clear()
+        # The expected failures are logged as warnings and errors
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        # run_worker installs its own SIGINT/SIGTERM handlers
+        handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+        self.addCleanup(lambda: [signal.signal(signum, handler) for signum, handler in handlers.items()])
+
+    def run_worker(self, job):
+        """Run the worker until the queue is idle, then make the job due again."""
+        call_command('run_worker', once=True, threads=1, stdout=StringIO(), stderr=StringIO())
+        job.refresh_from_db()
+        if job.status == 'pending':
+            delay = job.run_after - timezone.now()
+            Job.objects.filter(id=job.id).update(run_after=timezone.now())
+            return delay
+
+    def assert_backoff(self, delay, seconds):
+        self.assertAlmostEqual(delay.total_seconds(), seconds, delta=5)
+
+    def test_retries_with_backoff_until_done(self):
+        job = enqueue('tests.flaky', max_attempts=3, failures=2)
+
+        self.assert_backoff(self.run_worker(job), RETRY_BASE)
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertIn('attempt 1 failed', job.error)
+
+        self.assert_backoff(self.run_worker(job), RETRY_BASE * 2)
+        self.assertEqual((job.status, job.attempts), ('pending', 2))
+
+        self.run_worker(job)
+        self.assertEqual((job.status, job.attempts), ('done', 3))
+        self.assertEqual(job.result, {'attempts': 3})
+        self.assertEqual(job.error, '')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_gives_up_after_max_attempts(self):
+        job = enqueue('tests.flaky', max_attempts=2, failures=5)
+        self.run_worker(job)
+        self.run_worker(job)
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('attempt 2 failed', job.error)
+        self.assertIsNotNone(job.finished_at)
+        # A failed job is not picked up again
+        self.run_worker(job)
+        self.assertEqual(FLAKY_CALLS, [1, 2])
+
+    def test_job_not_due_yet_is_left_alone(self):
+        job = enqueue('tests.flaky', delay=60, failures=0)
+        self.run_worker(job)
+        self.assertEqual((job.status, job.attempts), ('pending', 0))
+        self.assertEqual(FLAKY_CALLS, [])
+
+
+# ==================== CART ====================
+
+class CartMergeTests(StoreTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('shopper', password='secret')
+
+    def add(self, product, quantity=1):
+        response = self.client.post(reverse('cart_add'), {'product_id': product.id, 'quantity': quantity})
+        self.assertTrue(response.json()['success'])
+
+    def login(self):
+        response = self.client.post(reverse('login'), {'username': 'shopper', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_session_cart_moves_to_the_account_on_login(self):
+        CartItem.objects.create(user=self.user, product=self.apple, quantity=9)
+        self.add(self.apple, 2)
+        self.add(self.samsung)
+        gone = self.create_product('Nokia 3310', 'Nokia')
+        self.add(gone)
+        gone.delete()
+
+        self.login()
+
+        quantities = dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+        # Same line: quantities add up, capped at the per-line maximum
+        self.assertEqual(quantities, {self.apple.id: 10, self.samsung.id: 1})
+        self.assertNotIn('cart', self.client.session)
+        self.assertEqual(self.client.session['cart_count'], 11)
+        self.assertEqual(self.client.get(reverse('api_cart')).json()['count'], 11)
+
+    def test_login_without_session_cart_keeps_the_account_cart(self):
+        CartItem.objects.create(user=self.user, product=self.samsung, quantity=2)
+        self.login()
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 2)
+        self.assertEqual(self.client.session['cart_count'], 2)
+
+
+# ==================== CHECKOUT ====================
+
+class CheckoutStressTests(TransactionTestCase):
+    """Concurrent buyers of the last units never oversell."""
+
+    BUYERS = 20
+    STOCK = 5
+
+    def setUp(self):
+        cache.clear()
+        filter_index.built_at = None
+        self.product = Product.objects.create(name='Flash Sale Phone', brand='Apple', price=5000000, stock=self.STOCK)
+        self.buyers = [User.objects.create_user(f'buyer{index}') for index in range(self.BUYERS)]
+        CartItem.objects.bulk_create([CartItem(user=user, product=self.product, quantity=1) for user in self.buyers])
+
+    def buy(self, user):
+        return place_order(Cart(SimpleNamespace(user=user, session={})))
+
+    def test_no_oversell(self):
+        results = run_concurrently(self.buy, [(user,) for user in self.buyers])
+
+        orders = [result for result in results if isinstance(result, Order)]
+        self.assertEqual(len(orders), self.STOCK, results)
+        # The others are told the product is short, never a database error
+        self.assertTrue(all(isinstance(result, (Order, CheckoutError)) for result in results), results)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertTrue(self.product.is_out_of_stock)
+        self.assertEqual(OrderItem.objects.filter(product=self.product).count(), self.STOCK)
+        # The losers' carts are left as they were
+        self.assertEqual(CartItem.objects.count(), self.BUYERS - self.STOCK)
+
+
+class ReservationTests(StoreTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+
+    def available(self, product):
+        return add_availability([{'id': product.id, 'stock': product.stock}])[0]['available']
+
+    def test_holds_replace_previous_ones_and_limit_others(self):
+        reserve_stock(self.alice, {self.apple.id: 4, self.samsung.id: 1})
+        reserve_stock(self.alice, {self.apple.id: 6})
+        self.assertEqual(self.available(self.apple), 4)
+        self.assertEqual(self.available(self.samsung), 10)
+
+        with self.assertRaises(OutOfStock):
+            reserve_stock(self.bob, {self.apple.id: 5})
+        # The failed attempt left nothing behind
+        self.assertFalse(StockReservation.objects.filter(user=self.bob).exists())
+        reserve_stock(self.bob, {self.apple.id: 4})
+        self.assertEqual(self.available(self.apple), 0)
+
+    def test_release_expired_frees_only_expired_holds(self):
+        reserve_stock(self.alice, {self.apple.id: 3}, minutes=-1)
+        reserve_stock(self.bob, {self.apple.id: 2})
+        self.assertEqual(self.available(self.apple), 8)
+
+        self.assertEqual(release_expired(), 1)
+        self.assertEqual(release_expired(), 0)
+        self.assertEqual(list(StockReservation.objects.values_list('user__username', flat=True)), ['bob'])
+        self.assertEqual(self.available(self.apple), 8)
+        # Held stock comes back once the hold is older than its expiry
+        self.assertEqual(release_expired(now=timezone.now() + timedelta(hours=1)), 1)
+        self.assertEqual(self.available(self.apple), 10)
+
+    def test_release_expired_purges_product_pages(self):
+        reserve_stock(self.alice, {self.apple.id: 3}, minutes=-1)
+        tags = [page_cache.product_tag(self.apple.slug), 'listing:all']
+        versions = page_cache.tag_versions(tags)
+        release_expired()
+        self.assertTrue(all(new != old for new, old in zip(page_cache.tag_versions(tags), versions)))
+
+
+class ReservationStressTests(TransactionTestCase):
+    """Concurrent checkout pages never hold more than the stock."""
+
+    SHOPPERS = 20
+    STOCK = 5
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Flash Sale Phone', brand='Apple', price=5000000, stock=self.STOCK)
+        self.shoppers = [User.objects.create_user(f'shopper{index}') for index in range(self.SHOPPERS)]
+
+    def test_no_overbooking(self):
+        results = run_concurrently(reserve_stock, [(user, {self.product.id: 1}) for user in self.shoppers])
+
+        # Every call either holds a unit or is told the product is short
+        self.assertTrue(all(not isinstance(result, Exception) or isinstance(result, OutOfStock) for result in results), results)
+        self.assertEqual(sum(not isinstance(result, Exception) for result in results), self.STOCK, results)
+        self.assertEqual(StockReservation.objects.filter(product=self.product).count(), self.STOCK)
+
+
+# ==================== COUPONS ====================
+
+def create_coupon(code, usage_limit=10, **fields):
+    now = timezone.now()
+    fields.setdefault('discount_type', 'percent')
+    fields.setdefault('discount_value', 10)
+    fields.setdefault('max_discount', 500000)
+    return Coupon.objects.create(
+        code=code, name=code, usage_limit=usage_limit,
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1), **fields
+    )
+
+
+class CouponLoadTests(TransactionTestCase):
+    """Parallel redemptions never exceed the usage limit or one use per user."""
+
+    USERS = 30
+    LIMIT = 10
+
+    def setUp(self):
+        cache.clear()
+        self.coupon = create_coupon('LOADTEST', usage_limit=self.LIMIT)
+        self.users = [User.objects.create_user(f'shopper{index}') for index in range(self.USERS)]
+
+    def test_parallel_redemptions(self):
+        # Every user twice, so both the limit and the per-user rule are raced
+        calls = [('loadtest', user, 5000000) for user in self.users * 2]
+        results = run_concurrently(redeem_coupon, calls)
+
+        redemptions = [result for result in results if isinstance(result, CouponRedemption)]
+        self.assertEqual(len(redemptions), self.LIMIT)
+        self.assertTrue(all(isinstance(result, (CouponRedemption, CouponError)) for result in results), results)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, self.coupon.usage_limit)
+        active = CouponRedemption.objects.filter(coupon=self.coupon, cancelled_at__isnull=True)
+        self.assertEqual(active.count(), self.LIMIT)
+        self.assertEqual(active.values('user').distinct().count(), self.LIMIT)
+
+
+class CouponRedemptionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        cls.coupon = create_coupon('SALE10', usage_limit=1)
+
+    def test_cancel_gives_the_use_back(self):
+        redemption = redeem_coupon('sale10', self.user, 2000000)
+        self.assertEqual(redemption.discount_amount, 200000)
+        with self.assertRaises(CouponError):
+            redeem_coupon('sale10', User.objects.create_user('other'), 2000000)
+
+        self.assertTrue(cancel_redemption(redemption))
+        self.assertFalse(cancel_redemption(redemption))
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 0)
+        # The same user may use it again once the first use is cancelled
+        redeem_coupon('sale10', self.user, 2000000)
+
+    def test_rejected_order_releases_its_coupon(self):
+        order = Order.objects.create(user=self.user, total_amount=1800000)
+        redeem_coupon('sale10', self.user, 2000000, order=order)
+
+        order.status = 'approved'
+        order.save()
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 1)
+
+        order.status = 'rejected'
+        order.save()
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 0)
+        self.assertIsNotNone(CouponRedemption.objects.get(order=order).cancelled_at)
+
+        # Saving the cancelled order again does not give a second use back
+        order.save()
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 0)
+
+
+class CouponValidationTests(TestCase):
+    """`/api/coupons/validate/` answers from the coupon index, kept current by admin edits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', is_staff=True)
+        cls.coupon = create_coupon('SALE10', min_order_amount=1000000)
+
+    def setUp(self):
+        # Start every test from an index built from this test's data
+        coupon_index.build()
+
+    def validate(self, code, amount=None):
+        params = {'code': code}
+        if amount is not None:
+            params['amount'] = amount
+        return self.client.get(reverse('api_validate_coupon'), params)
+
+    def test_valid_code_with_amount(self):
+        response = self.validate('sale10', 2000000)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['coupon']['code'], 'SALE10')
+        self.assertEqual(data['discount'], 200000)
+        self.assertEqual(data['total'], 1800000)
+
+    def test_valid_code_without_amount(self):
+        data = self.validate('SALE10').json()
+        self.assertTrue(data['success'])
+        self.assertIsNone(data['discount'])
+        self.assertIsNone(data['total'])
+
+    def test_rejections(self):
+        data = self.validate('sale10', 500000).json()
+        self.assertFalse(data['success'])
+        self.assertIn('tối thiểu', data['message'])
+
+        data = self.validate('NOPE', 2000000).json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'Mã giảm giá không tồn tại hoặc đã hết hạn.')
+
+        response = self.validate('sale10', 'abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    def test_no_queries(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(self.validate('sale10', 2000000).json()['success'])
+
+    def test_admin_add_and_delete_refresh_the_index(self):
+        self.client.force_login(self.admin)
+        self.assertFalse(self.validate('NEW50').json()['success'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('add_coupon'),
+                {'code': 'new50', 'name': 'New', 'discount_type': 'fixed', 'discount_value': 50000},
+            )
+        self.assertEqual(response.status_code, 302)
+        data = self.validate('new50', 300000).json()
+        self.assertTrue(data['success'], data)
+        self.assertEqual(data['discount'], 50000)
+
+        coupon = Coupon.objects.get(code='NEW50')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('delete_coupon', args=[coupon.id]))
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(self.validate('new50', 300000).json()['success'])
+
+    def test_edits_replace_the_indexed_coupon(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon.discount_value = 20
+            self.coupon.save()
+        self.assertEqual(self.validate('sale10', 2000000).json()['discount'], 400000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon.used_count = self.coupon.usage_limit
+            self.coupon.save()
+        data = self.validate('sale10', 2000000).json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'Mã giảm giá đã hết lượt sử dụng.')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon.is_active = False
+            self.coupon.save()
+        self.assertEqual(self.validate('sale10', 2000000).json()['message'], 'Mã giảm giá không tồn tại hoặc đã hết hạn.')
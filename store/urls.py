@@ -26,11 +26,25 @@ urlpatterns = [
     path('profile/add-address/', views.add_address, name='add_address'),
     path('profile/set-default-address/<int:address_id>/', views.set_default_address, name='set_default_address'),
     path('profile/delete-address/<int:address_id>/', views.delete_address, name='delete_address'),
+    # Cart
+    path('cart/', views.cart, name='cart'),
+    path('cart/add/', views.cart_add, name='cart_add'),
+    path('cart/update/', views.cart_update, name='cart_update'),
+    path('cart/remove/', views.cart_remove, name='cart_remove'),
+    path('checkout/', views.checkout, name='checkout'),
     # Get product details (AJAX)
     path('api/product/<int:product_id>/', views.get_product_details, name='get_product_details'),
     path('api/products/', views.api_products, name='api_products'),
+    path('api/search/suggest/', views.api_search_suggest, name='api_search_suggest'),
+    path('api/export/products/', views.export_products, name='export_products'),
+    path('api/sync/', views.api_sync, name='api_sync'),
+    path('api/cart/', views.api_cart, name='api_cart'),
+    path('api/coupons/validate/', views.api_validate_coupon, name='api_validate_coupon'),
+    path('api/jobs/<int:job_id>/', views.api_job_status, name='api_job_status'),
     # Admin
     path('qhun22/', views.admin_dashboard, name='admin_dashboard'),
+    path('qhun22/metrics/', views.admin_metrics, name='admin_metrics'),
+    path('qhun22/jobs/enqueue/', views.enqueue_job, name='enqueue_job'),
     # Admin - Promotions
     path('qhun22/promotions/', views.admin_promotions, name='admin_promotions'),
     path('qhun22/promotions/add/', views.add_promotion, name='add_promotion'),
@@ -3,197 +3,196 @@ Store app views for shopmobile project.
 """
 
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.urls import reverse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition, require_POST
 from django.contrib import messages
-from django.db.models import Q
 from django.contrib.auth.models import User
 from store.models import Category, Product, SpecialPromotion, Coupon
 from store.forms import UserRegistrationForm, UserLoginForm, ForgotPasswordForm
+from store.catalog import CatalogQuery, InvalidCursor, serialize_product_card
+from store.suggest import DEFAULT_LIMIT, suggest_index
+from store.payloads import get_product_payload
+from store.conditional import api_products_etag, home_etag, if_none_match, product_detail_etag
+from store.page_cache import anonymous_page_cache, fragment_version, home_cache_key, product_detail_cache_key
+from store.metrics import TimedJSONEncoder, registry as metrics_registry
 
 
 # Home page view
+@condition(etag_func=home_etag)
+@anonymous_page_cache(home_cache_key)
 def home(request):
     """
     Render the home page with product listings and promotions.
     Fetch products from database.
     """
-    # Get search query
-    search_query = request.GET.get('q', '')
-    brand_filter = request.GET.get('brand', '')
-    price_filter = request.GET.get('price', '')
-    sort = request.GET.get('sort', 'default')
+    catalog = CatalogQuery(request.GET)
 
     # Get all active categories
     categories = Category.objects.filter(is_active=True).order_by('sort_order')
 
-    # Get special promotions for promotion section (max 5)
+    # Get special promotions for promotion section (max 5).
+    # Only evaluated when the cached carousel fragment is stale.
     special_promotions = SpecialPromotion.objects.filter(
         is_active=True
     ).select_related('product', 'product__category')[:5]
 
-    # Get all active products with filters
-    products = Product.objects.filter(is_active=True).select_related('category')
+    # Filtered, sorted and paginated products
+    product_page = catalog.get_page()
 
-    # Apply search filter
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(brand__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
-
-    # Apply brand filter
-    if brand_filter:
-        products = products.filter(brand__iexact=brand_filter)
-
-    # Apply price filter
-    if price_filter:
-        if price_filter == '0-2000000':
-            products = products.filter(price__lt=2000000)
-        elif price_filter == '2000000-4000000':
-            products = products.filter(price__gte=2000000, price__lt=4000000)
-        elif price_filter == '4000000-7000000':
-            products = products.filter(price__gte=4000000, price__lt=7000000)
-        elif price_filter == '7000000-13000000':
-            products = products.filter(price__gte=7000000, price__lt=13000000)
-        elif price_filter == '13000000-20000000':
-            products = products.filter(price__gte=13000000, price__lt=20000000)
-        elif price_filter == '20000000-999999999':
-            products = products.filter(price__gte=20000000)
-
-    # Apply sorting
-    if sort == 'asc':
-        products = products.order_by('price')
-    elif sort == 'desc':
-        products = products.order_by('-price')
-    else:
-        products = products.order_by('-created_at', '-is_featured')
-
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(products, 10)
-    page_number = request.GET.get('page', 1)
-    product_page = paginator.get_page(page_number)
+    # Brand / price options with counts for the filter form
+    facets = catalog.get_facets()
 
     context = {
         'page_title': 'QHUN22',
         'categories': categories,
         'special_promotions': special_promotions,
+        'promotion_version': fragment_version('promotions'),
         'products': product_page,
-        'search_query': search_query,
-        'brand_filter': brand_filter,
-        'price_filter': price_filter,
-        'sort': sort,
-        'total_products': products.count(),
+        'search_query': catalog.search_query,
+        'brand_filter': catalog.brand_filter,
+        'price_filter': catalog.price_filter,
+        'sort': catalog.sort,
+        'facets': facets,
+        'total_products': product_page.paginator.count,
+        'next_cursor': catalog.get_next_cursor(product_page),
     }
     return render(request, 'home.html', context)
 
 
 # API endpoint for AJAX pagination
+@condition(etag_func=api_products_etag)
 def api_products(request):
     """
     Return products as JSON for AJAX pagination.
+
+    Passing `cursor` (empty for the first page) switches to keyset
+    pagination: the response carries an opaque `next_cursor` and the
+    total is only counted when `include_total=1` is requested.
     """
-    import json
-    
-    # Get search query
-    search_query = request.GET.get('q', '')
-    brand_filter = request.GET.get('brand', '')
-    price_filter = request.GET.get('price', '')
-    sort = request.GET.get('sort', 'default')
-    page = int(request.GET.get('page', 1))
-
-    # Get all active products with filters
-    products = Product.objects.filter(is_active=True).select_related('category')
-
-    # Apply search filter
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(brand__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
+    from store.checkout import add_availability
 
-    # Apply brand filter
-    if brand_filter:
-        products = products.filter(brand__iexact=brand_filter)
-
-    # Apply price filter
-    if price_filter:
-        if price_filter == '0-2000000':
-            products = products.filter(price__lt=2000000)
-        elif price_filter == '2000000-4000000':
-            products = products.filter(price__gte=2000000, price__lt=4000000)
-        elif price_filter == '4000000-7000000':
-            products = products.filter(price__gte=4000000, price__lt=7000000)
-        elif price_filter == '7000000-13000000':
-            products = products.filter(price__gte=7000000, price__lt=13000000)
-        elif price_filter == '13000000-20000000':
-            products = products.filter(price__gte=13000000, price__lt=20000000)
-        elif price_filter == '20000000-999999999':
-            products = products.filter(price__gte=20000000)
-
-    # Apply sorting
-    if sort == 'asc':
-        products = products.order_by('price')
-    elif sort == 'desc':
-        products = products.order_by('-price')
-    else:
-        products = products.order_by('-created_at', '-is_featured')
-
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(products, 10)
-    product_page = paginator.get_page(page)
-
-    # Build query string for pagination links
-    def build_query(page_num):
-        params = []
-        if search_query: params.append(f'q={search_query}')
-        if brand_filter: params.append(f'brand={brand_filter}')
-        if price_filter: params.append(f'price={price_filter}')
-        if sort != 'default': params.append(f'sort={sort}')
-        params.append(f'page={page_num}')
-        return '?' + '&'.join(params)
-
-    # Serialize products
-    products_data = []
-    for product in product_page:
-        products_data.append({
-            'id': product.id,
-            'name': product.name,
-            'slug': product.slug,
-            'brand': product.brand or '',
-            'price': float(product.price),
-            'original_price': float(product.original_price) if product.original_price else None,
-            'discount_percent': product.discount_percent,
-            'is_on_sale': product.is_on_sale,
-            'image': str(product.image) if product.image else None,
-            'stock': product.stock,
-            'category_name': product.category.name if product.category else '',
-        })
+    catalog = CatalogQuery(request.GET)
+
+    if 'cursor' in request.GET:
+        try:
+            products, next_cursor = catalog.get_keyset_page(request.GET.get('cursor', ''))
+        except InvalidCursor as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+        total_products = None
+        if request.GET.get('include_total') == '1':
+            total_products = catalog.get_queryset().count()
+
+        return JsonResponse({
+            'success': True,
+            'products': add_availability([serialize_product_card(product) for product in products]),
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None,
+            'per_page': catalog.per_page,
+            'total_products': total_products,
+            # Facets only change with the filters, so send them with the first page
+            'facets': None if request.GET.get('cursor') else catalog.get_facets(),
+            'filters': catalog.get_filters(),
+        }, encoder=TimedJSONEncoder)
+
+    product_page = catalog.get_page()
+    page = product_page.number
 
     return JsonResponse({
         'success': True,
-        'products': products_data,
+        'products': add_availability([serialize_product_card(product) for product in product_page]),
         'current_page': page,
-        'total_pages': paginator.num_pages,
+        'total_pages': product_page.paginator.num_pages,
         'has_previous': product_page.has_previous(),
         'has_next': product_page.has_next(),
-        'previous_page': build_query(page - 1) if product_page.has_previous() else None,
-        'next_page': build_query(page + 1) if product_page.has_next() else None,
+        'previous_page': catalog.build_query(page - 1) if product_page.has_previous() else None,
+        'next_page': catalog.build_query(page + 1) if product_page.has_next() else None,
+        'next_cursor': catalog.get_next_cursor(product_page),
         'start_index': product_page.start_index(),
         'end_index': product_page.end_index(),
-        'total_products': paginator.count,
-        'filters': {
-            'q': search_query,
-            'brand': brand_filter,
-            'price': price_filter,
-            'sort': sort,
-        }
-    })
+        'total_products': product_page.paginator.count,
+        'facets': catalog.get_facets(),
+        'filters': catalog.get_filters(),
+    }, encoder=TimedJSONEncoder)
+
+
+# API endpoint for coupon code validation while typing
+def api_validate_coupon(request):
+    """
+    Check a coupon code against the in-memory coupon index, without a
+    database query. With `amount` (the order total) the discount is
+    computed too. The coupon is only consumed when the order is placed.
+    """
+    from store.coupon_index import coupon_index
+    from store.coupons import CouponError
+
+    amount = request.GET.get('amount')
+    try:
+        amount = int(amount) if amount else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Số tiền không hợp lệ.'}, status=400)
+
+    try:
+        coupon, discount = coupon_index.validate(request.GET.get('code', ''), amount)
+    except CouponError as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+
+    return JsonResponse({
+        'success': True,
+        'coupon': {
+            'code': coupon.code,
+            'name': coupon.name,
+            'discount_type': coupon.discount_type,
+            'discount_value': float(coupon.discount_value),
+            'max_discount': float(coupon.max_discount) if coupon.max_discount else None,
+            'min_order_amount': float(coupon.min_order_amount),
+            'end_date': coupon.end_date,
+        },
+        'discount': discount,
+        'total': amount - discount if discount is not None else None,
+    }, encoder=TimedJSONEncoder)
+
+
+# API endpoint for search-as-you-type suggestions
+def api_search_suggest(request):
+    """
+    Return autocomplete suggestions for the header search box.
+    Answered from the in-memory prefix index, without a database query.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), 20)
+    except ValueError:
+        limit = DEFAULT_LIMIT
+
+    return JsonResponse({
+        'success': True,
+        'query': query,
+        'suggestions': suggest_index.suggest(query, limit=limit),
+    }, encoder=TimedJSONEncoder)
+
+
+# Incremental catalog sync for the mobile app and partners
+def api_sync(request):
+    """
+    Return catalog changes after the sync token `since` (0 for everything).
+
+    The response's `token` is the `since` of the next call; keep calling
+    while `has_more` is true.
+    """
+    from store.sync import DEFAULT_BATCH, MAX_BATCH, get_changes
+
+    try:
+        since = max(int(request.GET.get('since', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', DEFAULT_BATCH)), 1), MAX_BATCH)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Tham số không hợp lệ.'}, status=400)
+
+    return JsonResponse(dict(get_changes(since, limit), success=True), encoder=TimedJSONEncoder)
 
 
 # Registration view
@@ -310,8 +309,8 @@ def profile(request):
     Render user profile page.
     """
     from store.forms import UserProfileForm
-    from store.models import Order, Coupon
-    from django.utils import timezone
+    from store.models import Order
+    from store.coupon_index import coupon_index
 
     if request.method == 'POST':
         form = UserProfileForm(request.POST, instance=request.user)
@@ -325,12 +324,8 @@ def profile(request):
     # Get user orders
     orders = Order.objects.filter(user=request.user).prefetch_related('items').order_by('-created_at')
     
-    # Get valid coupons
-    coupons = Coupon.objects.filter(
-        is_active=True,
-        start_date__lte=timezone.now(),
-        end_date__gte=timezone.now()
-    ).order_by('end_date')
+    # Get valid coupons (from the in-memory index, see store.coupon_index)
+    coupons = coupon_index.active_coupons()
 
     context = {
         'page_title': 'Thông tin tài khoản - QHUN22',
@@ -459,19 +454,22 @@ def delete_address(request, address_id):
             return JsonResponse({'success': False, 'message': 'Địa chỉ không tồn tại.'}, status=404)
     return JsonResponse({'success': False, 'message': 'Phương thức không hợp lệ.'}, status=400)
 # Product detail view
+@condition(etag_func=product_detail_etag)
+@anonymous_page_cache(product_detail_cache_key)
 def product_detail(request, slug):
     """
     Render product detail page.
     """
     from django.shortcuts import get_object_or_404
+    from store.checkout import available_stock
+    from store.related import get_related_products
 
-    product = get_object_or_404(Product, slug=slug, is_active=True)
+    product = get_object_or_404(
+        Product.objects.select_related('category'), slug=slug, is_active=True
+    )
 
-    # Get related products (same category)
-    related_products = Product.objects.filter(
-        category=product.category,
-        is_active=True
-    ).exclude(id=product.id)[:5]
+    # Same category, closest in price (precomputed, see store.related)
+    related_products = get_related_products(product)
 
     # Get reviews for this product (empty list for now)
     reviews = []
@@ -479,12 +477,250 @@ def product_detail(request, slug):
     context = {
         'page_title': f'{product.name} - QHUN22',
         'product': product,
+        # Stock minus other buyers' checkout holds
+        'available_stock': available_stock(product),
         'related_products': related_products,
         'reviews': reviews,
     }
     return render(request, 'product_detail.html', context)
 
 
+# ==================== CART ====================
+
+def cart(request):
+    """
+    Render the shopping cart, pricing every line in one query.
+    """
+    from store.cart import Cart
+
+    context = {
+        'page_title': 'Giỏ hàng - QHUN22',
+        'cart': Cart(request).resolve(),
+    }
+    return render(request, 'cart.html', context)
+
+
+@ensure_csrf_cookie
+def api_cart(request):
+    """
+    Return the resolved cart as JSON. Also sets the CSRF cookie that
+    cached product pages need before posting to cart_add.
+    """
+    from store.cart import Cart
+
+    resolved = Cart(request).resolve()
+    return JsonResponse({
+        'success': True,
+        'count': resolved['count'],
+        'total': resolved['total'],
+        'lines': [{
+            'key': line['key'],
+            'product_id': line['product'].id if line['product'] else None,
+            'name': line['product'].name if line['product'] else '',
+            'storage': line['storage'],
+            'color': line['color'],
+            'warranty': line['warranty'],
+            'quantity': line['quantity'],
+            'unit_price': line['unit_price'],
+            'subtotal': line['subtotal'],
+            'problem': line['problem'],
+        } for line in resolved['lines']],
+    }, encoder=TimedJSONEncoder)
+
+
+@require_POST
+def cart_add(request):
+    """
+    Add a product to the cart (AJAX). POST: product_id, quantity and the
+    chosen storage, color and warranty options.
+    """
+    from store.cart import Cart, CartError, cart_count
+
+    product = Product.objects.filter(id=request.POST.get('product_id') or 0).only(
+        'id', 'is_active', 'stock', 'storage_options', 'color_options', 'warranty_options',
+    ).first()
+    if product is None:
+        return JsonResponse({'success': False, 'message': 'Không tìm thấy sản phẩm.'}, status=404)
+
+    try:
+        quantity = int(request.POST.get('quantity') or 1)
+    except ValueError:
+        quantity = 1
+
+    try:
+        Cart(request).add(
+            product, quantity,
+            storage=request.POST.get('storage'),
+            color=request.POST.get('color'),
+            warranty=request.POST.get('warranty'),
+        )
+    except CartError as e:
+        return JsonResponse({'success': False, 'message': str(e), 'cart_count': cart_count(request)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Đã thêm sản phẩm vào giỏ hàng!',
+        'cart_count': cart_count(request),
+    })
+
+
+@require_POST
+def cart_update(request):
+    """
+    Change the quantity of a cart line (0 removes it) from the cart page.
+    """
+    from store.cart import Cart
+
+    try:
+        quantity = int(request.POST.get('quantity', ''))
+    except ValueError:
+        messages.error(request, 'Số lượng không hợp lệ.')
+        return redirect('cart')
+
+    Cart(request).set_quantity(request.POST.get('key', ''), quantity)
+    return redirect('cart')
+
+
+@require_POST
+def cart_remove(request):
+    """
+    Remove a line from the cart.
+    """
+    from store.cart import Cart
+
+    Cart(request).remove(request.POST.get('key', ''))
+    messages.success(request, 'Đã xóa sản phẩm khỏi giỏ hàng.')
+    return redirect('cart')
+
+
+@login_required
+def checkout(request):
+    """
+    Show the order summary and place the order from the cart (POST:
+    address_id, payment_method, note).
+    """
+    from collections import Counter
+    from store.cart import Cart
+    from store.checkout import CheckoutError, InvalidCoupon, place_order, reserve_stock
+    from store.models import Address, Order
+
+    cart = Cart(request)
+    addresses = Address.objects.filter(user=request.user)
+
+    if request.method == 'POST':
+        address = addresses.filter(id=request.POST.get('address_id') or 0).first()
+        if address is None:
+            messages.error(request, 'Vui lòng chọn địa chỉ giao hàng.')
+            return redirect('checkout')
+        payment_method = request.POST.get('payment_method', 'cod')
+        if payment_method not in dict(Order.PAYMENT_CHOICES):
+            payment_method = 'cod'
+
+        try:
+            order = place_order(
+                cart,
+                shipping_address=address,
+                payment_method=payment_method,
+                note=request.POST.get('note', '').strip(),
+                coupon_code=request.POST.get('coupon_code', ''),
+            )
+        except InvalidCoupon as e:
+            messages.error(request, str(e))
+            return redirect('checkout')
+        except CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect('cart')
+
+        messages.success(request, f'Đặt hàng thành công! Mã đơn hàng của bạn là #{order.id}.')
+        return redirect('profile')
+
+    resolved = cart.resolve()
+    if not resolved['lines'] or resolved['has_problems']:
+        return redirect('cart')
+
+    # Hold the stock while the user fills in the form
+    quantities = Counter()
+    for line in resolved['lines']:
+        quantities[line['product'].id] += line['quantity']
+    try:
+        reserved_until = reserve_stock(
+            request.user, quantities, {line['product'].id: line['product'].name for line in resolved['lines']}
+        )
+    except CheckoutError as e:
+        messages.error(request, str(e))
+        return redirect('cart')
+
+    context = {
+        'page_title': 'Thanh toán - QHUN22',
+        'cart': resolved,
+        'reserved_until': reserved_until,
+        'addresses': addresses,
+        'payment_choices': Order.PAYMENT_CHOICES,
+    }
+    return render(request, 'checkout.html', context)
+
+
+# Admin - Metrics
+@user_passes_test(lambda u: u.is_staff)
+def admin_metrics(request):
+    """
+    Expose this process's per-view latency histograms in the Prometheus
+    text format (see store.metrics).
+    """
+    return HttpResponse(
+        metrics_registry.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@user_passes_test(lambda u: u.is_staff)
+def enqueue_job(request):
+    """
+    Queue a slow admin task (cache warmup or catalog export) for the
+    background worker and return its id; poll api_job_status for the result.
+    """
+    from store.jobs import enqueue
+
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Phương thức không hợp lệ.'}, status=405)
+
+    task_name = request.POST.get('task', '')
+    if task_name == 'cache.warm':
+        job = enqueue('cache.warm')
+    elif task_name == 'catalog.export':
+        from store.export import FORMATS, parse_since
+        export_format = request.POST.get('format', 'csv')
+        if export_format not in FORMATS:
+            return JsonResponse({'success': False, 'message': 'Định dạng không hợp lệ.'}, status=400)
+        since = None
+        if request.POST.get('since'):
+            try:
+                since = parse_since(request.POST['since']).isoformat()
+            except ValueError:
+                return JsonResponse({'success': False, 'message': 'Thời gian since không hợp lệ.'}, status=400)
+        job = enqueue('catalog.export', format=export_format, since=since)
+    else:
+        return JsonResponse({'success': False, 'message': 'Tác vụ không hợp lệ.'}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status_url': reverse('api_job_status', kwargs={'job_id': job.id}),
+    }, status=202)
+
+
+@user_passes_test(lambda u: u.is_staff)
+def api_job_status(request, job_id):
+    """Return the status (and result, once done) of a background job."""
+    from store.jobs import job_status
+    from store.models import Job
+
+    job = Job.objects.filter(id=job_id).first()
+    if job is None:
+        return JsonResponse({'success': False, 'message': 'Không tìm thấy tác vụ.'}, status=404)
+    return JsonResponse({'success': True, 'job': job_status(job)})
+
+
 # Admin Dashboard View
 @login_required
 def admin_dashboard(request):
@@ -638,36 +874,64 @@ def delete_promotion(request, promotion_id):
 def get_product_details(request, product_id):
     """
     Get product details for the detail modal via AJAX.
+    Served from the precomputed payload cache, with ETag/304 support.
     """
-    try:
-        product = Product.objects.select_related('category').get(id=product_id)
-        
-        # Check if product has promotion
-        promotion = SpecialPromotion.objects.filter(product_id=product_id, is_active=True).first()
-        discounted_price = float(promotion.discounted_price) if promotion else None
-        discount_percent = promotion.discount_percent if promotion else None
-        
-        context = {
-            'success': True,
-            'product': {
-                'id': product.id,
-                'name': product.name,
-                'brand': product.brand,
-                'price': float(product.price),
-                'original_price': float(product.original_price) if product.original_price else None,
-                'discounted_price': discounted_price,
-                'discount_percent': discount_percent,
-                'image': str(product.image),
-                'description': product.description,
-                'stock': product.stock,
-                'is_active': product.is_active,
-                'category_name': product.category.name if product.category else '',
-            }
-        }
-        return JsonResponse(context)
-    except Product.DoesNotExist:
+    payload = get_product_payload(product_id)
+    if payload is None:
         return JsonResponse({'success': False, 'message': 'Sản phẩm không tồn tại.'}, status=404)
 
+    if if_none_match(request, payload['etag']):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(payload['body'], content_type='application/json')
+    response['ETag'] = payload['etag']
+    return response
+
+
+def export_products(request):
+    """
+    Stream the catalog as CSV or JSONL for marketplaces and comparison sites.
+
+    Query parameters: `format` (csv|jsonl), `since` (ISO datetime, only
+    products changed after it), `gzip=1`. Open to staff, or to feeds
+    passing `token` equal to settings.STORE_EXPORT_TOKEN. The
+    X-Export-Started-At header is the `since` to use for the next run.
+    """
+    import hmac
+    from django.conf import settings
+    from django.http import StreamingHttpResponse
+    from django.utils import timezone
+    from store.export import FORMATS, iter_export, parse_since
+
+    token = request.GET.get('token', '')
+    allowed = request.user.is_staff or (
+        settings.STORE_EXPORT_TOKEN and hmac.compare_digest(token, settings.STORE_EXPORT_TOKEN)
+    )
+    if not allowed:
+        return JsonResponse({'success': False, 'message': 'Bạn không có quyền truy cập.'}, status=403)
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return JsonResponse({'success': False, 'message': 'Định dạng không hợp lệ.'}, status=400)
+
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_since(request.GET['since'])
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Thời gian since không hợp lệ.'}, status=400)
+
+    started_at = timezone.now()
+    compress = request.GET.get('gzip') == '1'
+    filename = f'products.{export_format}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        iter_export(export_format, since=since, compress=compress),
+        content_type='application/gzip' if compress else FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Export-Started-At'] = started_at.isoformat()
+    return response
+
 
 # ==================== PRODUCT MANAGEMENT (CUSTOM ADMIN) ====================
 
@@ -680,7 +944,7 @@ def admin_products(request):
     """
     from django.db.models import Count
     
-    products = Product.objects.order_by('-created_at')
+    products = Product.objects.select_related('category').order_by('-created_at')
     categories = Category.objects.filter(is_active=True).order_by('name')
     
     # Group products by brand
@@ -800,6 +1064,10 @@ def add_product(request):
                 product.image = image_file
 
             product.save()
+            if image_file:
+                # Resized copies are made by the background worker
+                from store.jobs import enqueue
+                enqueue('images.derivatives', product_id=product.id)
             messages.success(request, 'Đã thêm sản phẩm mới thành công!')
         except Exception as e:
             import traceback